@@ -2,13 +2,25 @@ import logging
 import azure.functions as func
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from azure.cosmos import CosmosClient
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+from ..shared_code.cosmos_batch import execute_in_batches
+from ..shared_code.post_cache import posts_cache
 
 # === Configuração ===
 COSMOS_ENDPOINT = os.getenv("COSMOS_ENDPOINT")
 COSMOS_KEY = os.getenv("COSMOS_KEY")
 COSMOS_DATABASE = os.getenv("COSMOS_DATABASE", "RedditApp")
 COSMOS_CONTAINER = os.getenv("COSMOS_CONTAINER", "posts")
+COSMOS_READ_CONCURRENCY = int(os.getenv("COSMOS_READ_CONCURRENCY", "16"))
+COSMOS_WRITE_PARTITIONS_CONCURRENCY = int(os.getenv("COSMOS_WRITE_PARTITIONS_CONCURRENCY", "8"))
+
+# Campos devolvidos ao web-app (inclui a análise guardada, para não voltar a classificar)
+POST_FIELDS = ("id", "subreddit", "title", "selftext", "url", "text_to_analyse",
+               "sentimento", "confiabilidade", "sentimento_probs", "sentimento_modelo", "sentimento_hash",
+               "termos")
 
 cosmos_client = None
 cosmos_container = None
@@ -26,12 +38,143 @@ def get_cosmos_container():
     return cosmos_container
 
 
+def partition_key_of(item_id: str):
+    """O id tem o formato <subreddit>_<id reddit>; a partition key é o subreddit."""
+    if "_" not in item_id:
+        return None
+    return item_id.split("_", 1)[0].strip()
+
+
+def project(item) -> dict:
+    return {field: item.get(field) for field in POST_FIELDS}
+
+
+def iter_read_posts(container, ids):
+    """
+    Lê os posts por point read (id + partition key derivada do id, ~1 RU cada), em paralelo.
+    Point reads não suportam projecção no servidor, por isso os campos são filtrados aqui.
+    Gera (id, post) pela ordem dos ids, à medida que as leituras terminam; post é None para
+    ids inválidos ou inexistentes.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+
+    def read(item_id):
+        pk = partition_key_of(item_id)
+        if not pk:
+            logging.warning(f"ID inválido: {item_id}, ignorado.")
+            return None
+        try:
+            return project(container.read_item(item=item_id, partition_key=pk))
+        except CosmosResourceNotFoundError:
+            logging.warning(f"Post não encontrado: {item_id}")
+        except Exception as e:
+            logging.error(f"Erro no point read de '{item_id}': {e}", exc_info=True)
+        return None
+
+    with ThreadPoolExecutor(max_workers=min(COSMOS_READ_CONCURRENCY, len(ids))) as pool:
+        yield from zip(ids, pool.map(read, ids))
+
+
+def iter_posts(container, ids):
+    """
+    Read-through: serve da cache os posts conhecidos e faz point reads só dos restantes.
+    Gera os posts pela ordem dos ids pedidos (sem duplicados), à medida que ficam disponíveis.
+    """
+    ids = list(dict.fromkeys(ids))
+    cached, missing = posts_cache.get_many(ids)
+    logging.info(f"Cache de posts: {len(ids) - len(missing)} hits, {len(missing)} misses")
+
+    reads = iter_read_posts(container, missing)
+    for item_id in ids:
+        if item_id in cached:
+            yield cached[item_id]
+            continue
+        _, post = next(reads)
+        if post is not None:
+            posts_cache.set_many({item_id: post})
+            yield post
+
+
+def get_posts(container, ids) -> list:
+    return list(iter_posts(container, ids))
+
+
+def write_analysis(container, updates):
+    """
+    Grava confiabilidade/sentimento com patch parcial (sem ler nem substituir o documento).
+    A partition key vem do id; os patches de cada partição seguem em transactional batches
+    e as partições são processadas em paralelo.
+    Devolve (ids actualizados, [{"id": ..., "error": ...}]).
+    """
+    failed = []
+    partitioned = {}
+    for update in updates:
+        item_id = update.get("id") if isinstance(update, dict) else None
+        confiabilidade = update.get("confiabilidade") if item_id else None
+        sentimento = update.get("sentimento") if item_id else None
+
+        if not item_id or confiabilidade is None or sentimento is None:
+            failed.append({"id": item_id, "error": "Faltam campos obrigatórios."})
+            continue
+        pk = partition_key_of(item_id)
+        if not pk:
+            failed.append({"id": item_id, "error": "ID inválido: esperado <subreddit>_<id>."})
+            continue
+        try:
+            confiabilidade = round(float(confiabilidade), 4)
+        except (TypeError, ValueError):
+            failed.append({"id": item_id, "error": "confiabilidade deve ser numérica."})
+            continue
+
+        patch_ops = [
+            {"op": "set", "path": "/confiabilidade", "value": confiabilidade},
+            {"op": "set", "path": "/sentimento", "value": sentimento},
+        ]
+        # Distribuição, modelo e hash do texto classificado, quando enviados, ficam com o resultado
+        for field in ("sentimento_probs", "sentimento_modelo", "sentimento_hash"):
+            if update.get(field):
+                patch_ops.append({"op": "set", "path": f"/{field}", "value": update[field]})
+        partitioned.setdefault(pk, []).append((item_id, ("patch", (item_id, patch_ops))))
+
+    success = []
+    if not partitioned:
+        return success, failed
+
+    def write_partition(entry):
+        pk, operations = entry
+        return execute_in_batches(container, pk, operations)
+
+    workers = min(COSMOS_WRITE_PARTITIONS_CONCURRENCY, len(partitioned))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for part_success, part_failed in pool.map(write_partition, partitioned.items()):
+            success.extend(part_success)
+            for f in part_failed:
+                if f.get("status") == 404:
+                    f = {**f, "error": "Item não encontrado no Cosmos DB."}
+                failed.append(f)
+
+    logging.info(f"✅ Actualizados {len(success)} posts em {len(partitioned)} partições ({len(failed)} falhados)")
+    return success, failed
+
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("Função HTTP recebida.")
 
     if req.method == "GET":
         return handle_get(req)
     elif req.method == "POST":
+        # POST {"ids": [...]} é uma leitura (listas de ids grandes demais para a query string)
+        try:
+            body = req.get_json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and "ids" in body and "updates" not in body:
+            return handle_get(req)
+        # POST {"invalidate": [...]}: o web-app gravou directamente no Cosmos e os posts em cache estão obsoletos
+        if isinstance(body, dict) and "invalidate" in body and "updates" not in body:
+            return handle_invalidate(body)
         return handle_post(req)
     else:
         return func.HttpResponse(
@@ -42,7 +185,15 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 
 
 def handle_get(req: func.HttpRequest) -> func.HttpResponse:
+    if req.params.get("cache_stats"):
+        return func.HttpResponse(
+            json.dumps({"cache": posts_cache.stats()}),
+            status_code=200,
+            mimetype="application/json"
+        )
+
     ids = []
+    output_format = req.params.get("format", "json")
     try:
         ids_param = req.params.get("ids")
         if ids_param:
@@ -51,7 +202,8 @@ def handle_get(req: func.HttpRequest) -> func.HttpResponse:
             try:
                 body = req.get_json()
                 if isinstance(body, dict) and "ids" in body and isinstance(body["ids"], list):
-                    ids = body["ids"]
+                    ids = [str(i).strip() for i in body["ids"] if str(i).strip()]
+                    output_format = body.get("format", output_format)
             except ValueError:
                 pass
     except Exception as e:
@@ -79,37 +231,12 @@ def handle_get(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json"
         )
 
-    partitioned = {}
-    for item_id in ids:
-        if "_" not in item_id:
-            logging.warning(f"ID inválido: {item_id}, ignorado.")
-            continue
-        subreddit_pk, _ = item_id.split("_", 1)
-        subreddit_pk = subreddit_pk.strip()
-        partitioned.setdefault(subreddit_pk, []).append(item_id)
+    if output_format == "ndjson":
+        # Um post por linha, serializado à medida que é lido
+        body = "".join(json.dumps(post, ensure_ascii=False) + "\n" for post in iter_posts(container, ids))
+        return func.HttpResponse(body, status_code=200, mimetype="application/x-ndjson")
 
-    results = []
-    for subreddit, id_list in partitioned.items():
-        try:
-            query = f"SELECT * FROM c WHERE c.id IN ({','.join(['@id'+str(i) for i in range(len(id_list))])})"
-            parameters = [{"name": "@id"+str(i), "value": id_val} for i, id_val in enumerate(id_list)]
-            items = list(container.query_items(
-                query=query,
-                parameters=parameters,
-                partition_key=subreddit
-            ))
-            for item in items:
-                sanitized = {
-                    "id": item.get("id"),
-                    "subreddit": item.get("subreddit"),
-                    "title": item.get("title"),
-                    "selftext": item.get("selftext"),
-                    "url": item.get("url"),
-                }
-                results.append(sanitized)
-        except Exception as e:
-            logging.error(f"Erro na query para subreddit '{subreddit}': {e}", exc_info=True)
-            continue
+    results = get_posts(container, ids)
 
     return func.HttpResponse(
         json.dumps({"posts": results}, ensure_ascii=False),
@@ -118,6 +245,24 @@ def handle_get(req: func.HttpRequest) -> func.HttpResponse:
     )
 
 
+def handle_invalidate(body: dict) -> func.HttpResponse:
+    ids = body.get("invalidate")
+    if not isinstance(ids, list):
+        return func.HttpResponse(
+            json.dumps({"error": "Formato esperado: {\"invalidate\": [\"subreddit_xxx\", ...]}"}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    ids = [str(i).strip() for i in ids if str(i).strip()]
+    posts_cache.invalidate(ids)
+    logging.info(f"Cache de posts: {len(ids)} ids invalidados a pedido")
+    return func.HttpResponse(
+        json.dumps({"invalidados": len(ids)}),
+        status_code=200,
+        mimetype="application/json"
+    )
+
+
 def handle_post(req: func.HttpRequest) -> func.HttpResponse:
     try:
         data = req.get_json()
@@ -155,46 +300,8 @@ def handle_post(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json"
         )
 
-    success = []
-    failed = []
-
-    for update in updates:
-        try:
-            item_id = update.get("id")
-            confiabilidade = update.get("confiabilidade")
-            sentimento = update.get("sentimento")
-
-            if not item_id or confiabilidade is None or sentimento is None:
-                failed.append({"id": item_id, "error": "Faltam campos obrigatórios."})
-                continue
-
-            # ✅ Obter PK real via query, tal como no detail_all
-            pk_query = list(container.query_items(
-                query="SELECT VALUE c.subreddit FROM c WHERE c.id = @id",
-                parameters=[{"name": "@id", "value": item_id}],
-                enable_cross_partition_query=True
-            ))
-
-            if not pk_query:
-                failed.append({"id": item_id, "error": "Item não encontrado no Cosmos DB."})
-                continue
-
-            real_pk = pk_query[0].strip()
-            logging.info(f"📌 PK confirmado: ID={item_id} | PK='{real_pk}'")
-
-            # ✅ Read + update
-            item = container.read_item(item=item_id, partition_key=real_pk)
-            item["confiabilidade"] = round(float(confiabilidade), 4)
-            item["sentimento"] = sentimento
-
-            container.replace_item(item=item_id, body=item)
-            logging.info(f"✅ Actualizado: {item_id}")
-
-            success.append(item_id)
-
-        except Exception as e:
-            logging.error(f"Erro ao actualizar ID {update.get('id')}: {e}", exc_info=True)
-            failed.append({"id": update.get("id"), "error": str(e)})
+    success, failed = write_analysis(container, updates)
+    posts_cache.invalidate(success)
 
     return func.HttpResponse(
         json.dumps({"actualizados": success, "falhados": failed}, ensure_ascii=False),
@@ -0,0 +1,146 @@
+import os
+import json
+import logging
+import time
+
+import azure.functions as func
+
+from ..shared_code.reddit_ingest import (
+    CLIENT_ID, CLIENT_SECRET, REDDIT_USER, REDDIT_PASSWORD, MAX_INGEST_LIMIT,
+    get_cosmos_container, fetch_and_store, load_checkpoint
+)
+
+logger = logging.getLogger(__name__)
+
+# === Configuração ===
+# Watchlist em JSON, ex.:
+# [{"subreddit": "python", "sort": "new", "limit": 200, "interval_minutes": 15}, ...]
+# Lida de INGEST_WATCHLIST ou, se vazio, do ficheiro indicado em INGEST_WATCHLIST_FILE.
+INGEST_WATCHLIST = os.getenv("INGEST_WATCHLIST", "")
+INGEST_WATCHLIST_FILE = os.getenv("INGEST_WATCHLIST_FILE", "")
+DEFAULT_INTERVAL_MINUTES = int(os.getenv("INGEST_DEFAULT_INTERVAL_MINUTES", "30"))
+DEFAULT_LIMIT = int(os.getenv("INGEST_DEFAULT_LIMIT", "100"))
+# Limites por execução do timer (o trigger corre de 5 em 5 minutos)
+MAX_ENTRIES_PER_RUN = int(os.getenv("INGEST_MAX_ENTRIES_PER_RUN", "10"))
+RUN_TIME_BUDGET_SECONDS = int(os.getenv("INGEST_RUN_TIME_BUDGET_SECONDS", "240"))
+
+
+def main(timer: func.TimerRequest) -> None:
+    if timer.past_due:
+        logger.warning("Timer de ingestão atrasado; a executar agora.")
+
+    if not all([CLIENT_ID, CLIENT_SECRET, REDDIT_USER, REDDIT_PASSWORD]):
+        logger.error("Credenciais do Reddit em falta; ingestão agendada ignorada.")
+        return
+
+    try:
+        watchlist = load_watchlist()
+    except Exception as e:
+        logger.error(f"Watchlist inválida: {e}", exc_info=True)
+        return
+    if not watchlist:
+        logger.info("Watchlist vazia; nada a ingerir.")
+        return
+
+    container = get_cosmos_container()
+    summary = run_schedule(
+        watchlist,
+        last_ingested=lambda entry: load_checkpoint(container, entry["subreddit"], entry["sort"]).get("last_ingested_at"),
+        ingest=lambda entry: fetch_and_store(entry["subreddit"], entry["sort"], entry["limit"], entry["stop_at_existing"])
+    )
+    logger.info(f"Ingestão agendada concluída: {json.dumps(summary, ensure_ascii=False)}")
+
+
+def load_watchlist(raw: str = None) -> list:
+    """Lê e normaliza a watchlist (subreddit, sort, limit, interval_minutes, stop_at_existing)."""
+    if raw is None:
+        raw = INGEST_WATCHLIST
+        if not raw and INGEST_WATCHLIST_FILE:
+            with open(INGEST_WATCHLIST_FILE, encoding="utf-8") as f:
+                raw = f.read()
+    if not raw:
+        return []
+
+    entries = []
+    for entry in json.loads(raw):
+        if not isinstance(entry, dict):
+            logger.warning(f"Entrada da watchlist inválida ignorada: {entry}")
+            continue
+        subreddit = str(entry.get("subreddit", "")).strip()
+        if not subreddit:
+            logger.warning(f"Entrada da watchlist sem subreddit ignorada: {entry}")
+            continue
+        try:
+            limit = int(entry.get("limit", DEFAULT_LIMIT))
+            interval_minutes = float(entry.get("interval_minutes", DEFAULT_INTERVAL_MINUTES))
+        except (TypeError, ValueError):
+            logger.warning(f"Entrada da watchlist com limit/interval_minutes não numérico ignorada: {entry}")
+            continue
+        # Mesmas regras do pedido HTTP da SearchFunction (limit entre 1 e MAX_INGEST_LIMIT)
+        if limit < 1:
+            logger.warning(f"Entrada da watchlist com limit={limit} ignorada (deve ser positivo): '{subreddit}'")
+            continue
+        if not interval_minutes > 0:
+            logger.warning(f"Entrada da watchlist com interval_minutes={interval_minutes} ignorada "
+                           f"(deve ser positivo): '{subreddit}'")
+            continue
+        if limit > MAX_INGEST_LIMIT:
+            logger.warning(f"limit={limit} de '{subreddit}' acima do máximo; a usar {MAX_INGEST_LIMIT}.")
+            limit = MAX_INGEST_LIMIT
+        sort = entry.get("sort", "hot")
+        entries.append({
+            "subreddit": subreddit,
+            "sort": sort,
+            "limit": limit,
+            "interval_minutes": interval_minutes,
+            # Em 'new' os posts mais antigos já foram ingeridos: basta ir até ao primeiro conhecido
+            "stop_at_existing": bool(entry.get("stop_at_existing", sort == "new")),
+        })
+    return entries
+
+
+def prioritize(watchlist, last_ingested, now: float) -> list:
+    """
+    Devolve as entradas em atraso, da mais desactualizada para a menos.
+    A prioridade é (tempo desde a última ingestão) / intervalo; entradas nunca ingeridas vão primeiro.
+    """
+    due = []
+    for entry in watchlist:
+        last = last_ingested(entry)
+        if last is None:
+            staleness = float("inf")
+        else:
+            staleness = (now - last) / (entry["interval_minutes"] * 60)
+        if staleness >= 1:
+            due.append((staleness, entry))
+    due.sort(key=lambda pair: pair[0], reverse=True)
+    return [entry for _, entry in due]
+
+
+def run_schedule(watchlist, last_ingested, ingest, clock=time.time,
+                 max_entries: int = MAX_ENTRIES_PER_RUN, time_budget: float = RUN_TIME_BUDGET_SECONDS) -> list:
+    """
+    Ingere as entradas em atraso por ordem de prioridade, até `max_entries` ou até esgotar
+    `time_budget` segundos. `last_ingested`, `ingest` e `clock` são injectados para se poder
+    correr localmente com um relógio falso e um Reddit stub (REDDIT_API_BASE / REDDIT_AUTH_URL).
+    """
+    started = clock()
+    summary = []
+    for entry in prioritize(watchlist, last_ingested, started)[:max_entries]:
+        if clock() - started >= time_budget:
+            logger.warning("Orçamento de tempo da ingestão agendada esgotado; restantes ficam para a próxima.")
+            break
+        name = f"{entry['subreddit']}/{entry['sort']}"
+        try:
+            posts, failed, changes = ingest(entry)
+            summary.append({
+                "entry": name,
+                "posts": len(posts),
+                "failed": len(failed),
+                "new": len(changes["new"]),
+                "updated": len(changes["updated"]),
+            })
+        except Exception as e:
+            logger.error(f"Erro na ingestão agendada de {name}: {e}", exc_info=True)
+            summary.append({"entry": name, "error": str(e)})
+    return summary
@@ -6,74 +6,58 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configurar vendored_path antes de imports externos
-def _setup_vendored_path():
-    cwd = os.getcwd()
-    basedir = os.path.dirname(__file__)
-    candidates = [
-        os.path.join(cwd, '.python_packages', 'lib', 'site-packages'),
-        os.path.join(os.path.abspath(os.path.join(basedir, '..')), '.python_packages', 'lib', 'site-packages')
-    ]
-    logger.info(f"[DEBUG] cwd: {cwd}, __file__: {__file__}, basedir: {basedir}")
-    for vendored in candidates:
-        exists = os.path.isdir(vendored)
-        logger.info(f"[DEBUG] Vendored candidate {vendored} exists? {exists}")
-        if exists:
-            if vendored not in sys.path:
-                sys.path.insert(0, vendored)
-                logger.info(f"[DEBUG] Inserido vendored_path em sys.path: {vendored}")
-            else:
-                logger.info(f"[DEBUG] Vendored_path já em sys.path: {vendored}")
-            return
-    logger.info(f"[DEBUG] Nenhum vendored_path encontrado em candidatos: {candidates}")
-
-_setup_vendored_path()
-
-# Agora importa normalmente
+# Importar shared_code primeiro: configura o vendored_path antes dos imports externos
+from ..shared_code.reddit_ingest import (
+    CLIENT_ID, CLIENT_SECRET, REDDIT_USER, REDDIT_PASSWORD, MAX_INGEST_LIMIT, fetch_and_store
+)
+
 import json
-import requests
-from requests.auth import HTTPBasicAuth
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import azure.functions as func
-from azure.cosmos import CosmosClient
-
-# --- Configurações e credenciais ---
-CLIENT_ID = os.environ.get("CLIENT_ID") or os.environ.get("REDDIT_CLIENT_ID")
-CLIENT_SECRET = os.environ.get("SECRET") or os.environ.get("REDDIT_CLIENT_SECRET")
-REDDIT_USER = os.environ.get("REDDIT_USER")
-REDDIT_PASSWORD = os.environ.get("REDDIT_PASSWORD")
-
-COSMOS_ENDPOINT = os.environ.get("COSMOS_ENDPOINT")
-COSMOS_KEY = os.environ.get("COSMOS_KEY")
-COSMOS_DATABASE = os.environ.get("COSMOS_DATABASE", "RedditApp")
-COSMOS_CONTAINER = os.environ.get("COSMOS_CONTAINER", "posts")
-
-logger.info(f"Credenciais Reddit: CLIENT_ID={'OK' if CLIENT_ID else 'MISSING'}, "
-            f"CLIENT_SECRET={'OK' if CLIENT_SECRET else 'MISSING'}, "
-            f"REDDIT_USER={'OK' if REDDIT_USER else 'MISSING'}, "
-            f"REDDIT_PASSWORD={'OK' if REDDIT_PASSWORD else 'MISSING'}")
-logger.info(f"Cosmos DB: ENDPOINT={'OK' if COSMOS_ENDPOINT else 'MISSING'}, "
-            f"KEY={'OK' if COSMOS_KEY else 'MISSING'}")
+
+# Modo batch (vários subreddits): número de listagens ingeridas em paralelo
+FANOUT_CONCURRENCY = int(os.environ.get("FANOUT_CONCURRENCY", "8"))
+MAX_FANOUT_SUBREDDITS = int(os.environ.get("MAX_FANOUT_SUBREDDITS", "50"))
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logger.info("[DEBUG] sys.path em main começa com: %s", sys.path[:5])
     logger.info("HTTP trigger recebido para buscar Reddit e gravar no Cosmos")
 
-    subreddit = req.params.get("subreddit")
-    if not subreddit:
+    options = _request_options(req)
+    subreddit = options.get("subreddit")
+    subreddits = _parse_subreddits(options.get("subreddits"))
+    if not subreddit and not subreddits:
         return func.HttpResponse(
-            json.dumps({"error": "Falta parâmetro 'subreddit'."}, ensure_ascii=False),
+            json.dumps({"error": "Falta parâmetro 'subreddit' ou 'subreddits'."}, ensure_ascii=False),
+            status_code=400, mimetype="application/json"
+        )
+    if len(subreddits) > MAX_FANOUT_SUBREDDITS:
+        return func.HttpResponse(
+            json.dumps({"error": f"Máximo de {MAX_FANOUT_SUBREDDITS} subreddits por pedido."}, ensure_ascii=False),
             status_code=400, mimetype="application/json"
         )
 
     try:
-        limit = int(req.params.get("limit", "10"))
-    except ValueError:
+        limit = int(options.get("limit", "10"))
+    except (TypeError, ValueError):
         return func.HttpResponse(
             json.dumps({"error": "Parâmetro 'limit' deve ser inteiro."}, ensure_ascii=False),
             status_code=400, mimetype="application/json"
         )
 
-    sort = req.params.get("sort", "hot")
+    if limit < 1:
+        return func.HttpResponse(
+            json.dumps({"error": "Parâmetro 'limit' deve ser positivo."}, ensure_ascii=False),
+            status_code=400, mimetype="application/json"
+        )
+    if limit > MAX_INGEST_LIMIT:
+        logger.warning(f"limit={limit} acima do máximo; a usar {MAX_INGEST_LIMIT}.")
+        limit = MAX_INGEST_LIMIT
+
+    sort = options.get("sort", "hot")
+    stop_at_existing = str(options.get("stop_at_existing", "")).lower() in ("1", "true", "yes")
+    output_format = options.get("format", "json")
 
     if not all([CLIENT_ID, CLIENT_SECRET, REDDIT_USER, REDDIT_PASSWORD]):
         missing = [k for k, v in {
@@ -87,8 +71,12 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500, mimetype="application/json"
         )
 
+    if subreddits:
+        body = "".join(_fan_out(subreddits, sort, limit, stop_at_existing))
+        return func.HttpResponse(body, status_code=200, mimetype="application/x-ndjson")
+
     try:
-        posts = _fetch_and_store(subreddit, sort, limit)
+        posts, failed, changes = fetch_and_store(subreddit, sort, limit, stop_at_existing)
     except Exception as e:
         logger.error(f"Erro interno na ingestão: {e}", exc_info=True)
         return func.HttpResponse(
@@ -96,77 +84,66 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500, mimetype="application/json"
         )
 
-    sanitized = []
-    for p in posts:
-        sanitized.append({
-            "id": p.get("id"),
-            "subreddit": p.get("subreddit"),
-            "title": p.get("title"),
-            "selftext": p.get("selftext"),
-            "url": p.get("url")
-        })
-
-    body = json.dumps({"posts": sanitized}, ensure_ascii=False)
+    if output_format == "ndjson":
+        # Um post por linha; a última linha traz o resumo da ingestão
+        lines = [json.dumps(_sanitize(p), ensure_ascii=False) for p in posts]
+        lines.append(json.dumps({"summary": {"failed": failed, **changes}}, ensure_ascii=False))
+        return func.HttpResponse("\n".join(lines) + "\n", status_code=200, mimetype="application/x-ndjson")
+
+    sanitized = [_sanitize(p) for p in posts]
+    body = json.dumps({"posts": sanitized, "failed": failed, **changes}, ensure_ascii=False)
     return func.HttpResponse(body, status_code=200, mimetype="application/json")
 
 
-def _fetch_and_store(subreddit: str, sort: str, limit: int):
-    auth = HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET)
-    token_res = requests.post(
-        "https://www.reddit.com/api/v1/access_token",
-        auth=auth,
-        data={
-            "grant_type": "password",
-            "username": REDDIT_USER,
-            "password": REDDIT_PASSWORD
-        },
-        headers={"User-Agent": f"{REDDIT_USER}/0.1"}
-    )
-    token_res.raise_for_status()
-    token = token_res.json().get("access_token")
-    if not token:
-        raise RuntimeError("Não obteve access_token do Reddit.")
-
-    res = requests.get(
-        f"https://oauth.reddit.com/r/{subreddit}/{sort}",
-        headers={
-            "Authorization": f"bearer {token}",
-            "User-Agent": f"{REDDIT_USER}/0.1"
-        },
-        params={"limit": limit}
-    )
-    res.raise_for_status()
-    children = res.json().get("data", {}).get("children", [])
-    if not isinstance(children, list):
-        raise RuntimeError("Resposta inesperada da API do Reddit.")
-
-    client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
-    db = client.create_database_if_not_exists(COSMOS_DATABASE)
-    cont = db.create_container_if_not_exists(
-        id=COSMOS_CONTAINER,
-        partition_key={"path": "/subreddit"}
-    )
-
-    posts = []
-    for c in children:
-        d = c.get("data", {})
-        rid = d.get("id")
-        if not rid:
-            continue
-
-        title = d.get("title", "") or ""
-        selftext = d.get("selftext", "") or ""
-
-        item = {
-            "id": f"{subreddit}_{rid}",
-            "subreddit": subreddit,
-            "title": title,
-            "selftext": selftext,
-            "url": d.get("url", "")
+def _request_options(req: func.HttpRequest) -> dict:
+    """Junta a query string e, em POST, o corpo JSON (que tem prioridade) num só dicionário."""
+    options = dict(req.params)
+    if req.method == "POST":
+        try:
+            body = req.get_json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            options.update(body)
+    return options
+
+
+def _parse_subreddits(value) -> list:
+    """Aceita 'a,b,c' ou uma lista JSON; remove vazios e duplicados mantendo a ordem."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    names = [str(v).strip() for v in value if str(v).strip()]
+    return list(dict.fromkeys(names))
+
+
+def _sanitize(p) -> dict:
+    return {
+        "id": p.get("id"),
+        "subreddit": p.get("subreddit"),
+        "title": p.get("title"),
+        "selftext": p.get("selftext"),
+        "url": p.get("url")
+    }
+
+
+def _fan_out(subreddits, sort: str, limit: int, stop_at_existing: bool):
+    """
+    Ingere vários subreddits em paralelo (pool limitado a FANOUT_CONCURRENCY), partilhando o
+    token e o container do worker. Gera uma linha NDJSON por subreddit, pela ordem em que terminam.
+    """
+    with ThreadPoolExecutor(max_workers=min(FANOUT_CONCURRENCY, len(subreddits))) as pool:
+        futures = {
+            pool.submit(fetch_and_store, name, sort, limit, stop_at_existing): name
+            for name in subreddits
         }
-
-        cont.upsert_item(item)
-        logger.info(f"✅ Upserted item: {item['id']}")
-        posts.append(item)
-
-    return posts
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                posts, failed, changes = future.result()
+                line = {"subreddit": name, "posts": [_sanitize(p) for p in posts], "failed": failed, **changes}
+            except Exception as e:
+                logger.error(f"Erro interno na ingestão de '{name}': {e}", exc_info=True)
+                line = {"subreddit": name, "error": str(e)}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
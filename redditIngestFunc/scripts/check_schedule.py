@@ -0,0 +1,113 @@
+"""
+Verifica localmente o escalonamento da ScheduledIngestFunction, sem Reddit nem Cosmos:
+run_schedule corre com um relógio falso, checkpoints em memória e uma ingestão stub.
+Cobre a ordem por prioridade, as entradas ainda dentro do intervalo, o isolamento de falhas,
+os limites por execução e a validação da watchlist.
+
+    python scripts/check_schedule.py
+"""
+import json
+import logging
+import os
+import sys
+
+FUNC_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# As funções usam imports relativos (..shared_code): importa-se a Function App como pacote
+sys.path.insert(0, os.path.dirname(FUNC_APP_DIR))
+
+from redditIngestFunc.ScheduledIngestFunction import load_watchlist, run_schedule  # noqa: E402
+
+NOW = 1_700_000_000.0
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def stub_ingest(clock, calls, failing=(), seconds_per_entry: float = 1.0):
+    """Ingestão stub: regista a chamada, avança o relógio e falha nos subreddits indicados."""
+    def ingest(entry):
+        calls.append(entry["subreddit"])
+        clock.advance(seconds_per_entry)
+        if entry["subreddit"] in failing:
+            raise RuntimeError("Reddit indisponível (stub)")
+        return [{"id": f"{entry['subreddit']}_1"}], [], {"new": [f"{entry['subreddit']}_1"], "updated": [], "unchanged": []}
+    return ingest
+
+
+def entry(subreddit: str, interval_minutes: float = 10, **extra) -> dict:
+    return {"subreddit": subreddit, "sort": "new", "limit": 50, "interval_minutes": interval_minutes, **extra}
+
+
+def check_priority_and_intervals():
+    # minutos desde a última ingestão: nunca, 60 (6x o intervalo), 25 (2.5x) e 5 (ainda não devido)
+    checkpoints = {"nunca": None, "muito": NOW - 60 * 60, "pouco": NOW - 25 * 60, "recente": NOW - 5 * 60}
+    watchlist = [entry("recente"), entry("pouco"), entry("muito"), entry("nunca")]
+    clock, calls = FakeClock(NOW), []
+    summary = run_schedule(watchlist, lambda e: checkpoints[e["subreddit"]], stub_ingest(clock, calls), clock=clock)
+    assert calls == ["nunca", "muito", "pouco"], calls
+    assert [s["entry"] for s in summary] == ["nunca/new", "muito/new", "pouco/new"], summary
+
+
+def check_failure_isolation():
+    watchlist = [entry("a"), entry("b"), entry("c")]
+    clock, calls = FakeClock(NOW), []
+    summary = run_schedule(watchlist, lambda e: None, stub_ingest(clock, calls, failing={"b"}), clock=clock)
+    assert calls == ["a", "b", "c"], calls
+    errors = [s["entry"] for s in summary if "error" in s]
+    assert errors == ["b/new"], summary
+
+
+def check_run_limits():
+    watchlist = [entry(f"s{i}") for i in range(6)]
+
+    clock, calls = FakeClock(NOW), []
+    run_schedule(watchlist, lambda e: None, stub_ingest(clock, calls), clock=clock, max_entries=4)
+    assert len(calls) == 4, calls
+
+    # Cada ingestão leva 100s no relógio falso: com 250s de orçamento só cabem três
+    clock, calls = FakeClock(NOW), []
+    run_schedule(watchlist, lambda e: None, stub_ingest(clock, calls, seconds_per_entry=100),
+                 clock=clock, time_budget=250)
+    assert len(calls) == 3, calls
+
+
+def check_watchlist_validation():
+    raw = json.dumps([
+        entry("ok"),
+        entry("zero", interval_minutes=0),
+        entry("negativo", interval_minutes=-5),
+        {**entry("limite"), "limit": -5},
+        {**entry("texto"), "limit": "muitos"},
+        {"sort": "new"},
+        "python",
+        {**entry("grande"), "limit": 10 ** 9},
+    ])
+    entries = load_watchlist(raw)
+    assert [e["subreddit"] for e in entries] == ["ok", "grande"], entries
+    assert entries[1]["limit"] < 10 ** 9, entries[1]
+
+    # Uma watchlist só com entradas inválidas não faz o escalonamento falhar
+    clock, calls = FakeClock(NOW), []
+    assert run_schedule(load_watchlist(json.dumps([entry("zero", interval_minutes=0)])),
+                        lambda e: NOW, stub_ingest(clock, calls), clock=clock) == []
+
+
+def main():
+    # A falha simulada em check_failure_isolation é esperada: não polui a saída
+    logging.basicConfig(level=logging.CRITICAL)
+    checks = [check_priority_and_intervals, check_failure_isolation, check_run_limits, check_watchlist_validation]
+    for check in checks:
+        check()
+        print(f"OK  {check.__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Configurar vendored_path antes de imports externos (corre ao importar shared_code,
+# antes de qualquer módulo partilhado importar requests ou o SDK do Azure)
+def _setup_vendored_path():
+    cwd = os.getcwd()
+    basedir = os.path.dirname(__file__)
+    candidates = [
+        os.path.join(cwd, '.python_packages', 'lib', 'site-packages'),
+        os.path.join(os.path.abspath(os.path.join(basedir, '..')), '.python_packages', 'lib', 'site-packages')
+    ]
+    logger.info(f"[DEBUG] cwd: {cwd}, __file__: {__file__}, basedir: {basedir}")
+    for vendored in candidates:
+        exists = os.path.isdir(vendored)
+        logger.info(f"[DEBUG] Vendored candidate {vendored} exists? {exists}")
+        if exists:
+            if vendored not in sys.path:
+                sys.path.insert(0, vendored)
+                logger.info(f"[DEBUG] Inserido vendored_path em sys.path: {vendored}")
+            else:
+                logger.info(f"[DEBUG] Vendored_path já em sys.path: {vendored}")
+            return
+    logger.info(f"[DEBUG] Nenhum vendored_path encontrado em candidatos: {candidates}")
+
+_setup_vendored_path()
@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import CosmosBatchOperationError, CosmosHttpResponseError
+
+logger = logging.getLogger(__name__)
+
+# Limites de uma transactional batch do Cosmos DB
+BATCH_MAX_OPERATIONS = 100
+BATCH_MAX_BYTES = 1_800_000  # o limite é 2 MB; fica uma folga para o envelope do pedido
+
+COSMOS_MAX_THROTTLE_RETRIES = int(os.getenv("COSMOS_MAX_THROTTLE_RETRIES", "5"))
+COSMOS_WRITE_CONCURRENCY = int(os.getenv("COSMOS_WRITE_CONCURRENCY", "8"))
+
+
+def execute_in_batches(container, partition_key, operations):
+    """
+    Executa operações da mesma partição em transactional batches (até 100 operações / ~2 MB cada).
+
+    `operations` é uma lista de (item_id, operação), em que a operação segue o formato de
+    `execute_item_batch`, ex.: ("upsert", (item,)) ou ("patch", (item_id, patch_ops)).
+    Se uma batch falhar, as suas operações são repetidas uma a uma (em paralelo, limitado)
+    para se saber o resultado de cada item.
+
+    Devolve (sucessos, falhados): lista de ids e lista de {"id": ..., "error": ..., "status": ...},
+    em que `status` é o código HTTP do Cosmos (ex.: 409, 412), quando existe.
+    """
+    success, failed = [], []
+    for chunk in _chunk_operations(operations):
+        try:
+            _with_throttle_retry(lambda: container.execute_item_batch(
+                batch_operations=[op for _, op in chunk],
+                partition_key=partition_key
+            ))
+            success.extend(item_id for item_id, _ in chunk)
+        except (CosmosBatchOperationError, CosmosHttpResponseError) as e:
+            logger.warning(f"Batch de {len(chunk)} operações falhou na partição '{partition_key}' "
+                           f"({e}); a repetir item a item.")
+            chunk_success, chunk_failed = _execute_individually(container, partition_key, chunk)
+            success.extend(chunk_success)
+            failed.extend(chunk_failed)
+    return success, failed
+
+
+def _chunk_operations(operations):
+    chunk, chunk_bytes = [], 0
+    for item_id, op in operations:
+        op_bytes = len(json.dumps(op[1], ensure_ascii=False, default=str).encode("utf-8"))
+        if chunk and (len(chunk) >= BATCH_MAX_OPERATIONS or chunk_bytes + op_bytes > BATCH_MAX_BYTES):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append((item_id, op))
+        chunk_bytes += op_bytes
+    if chunk:
+        yield chunk
+
+
+def _execute_individually(container, partition_key, operations):
+    def run(entry):
+        item_id, op = entry
+        try:
+            _with_throttle_retry(lambda: _execute_single(container, partition_key, op))
+            return item_id, None
+        except Exception as e:
+            logger.error(f"Falha na operação '{op[0]}' do item {item_id}: {e}")
+            return item_id, e
+
+    success, failed = [], []
+    with ThreadPoolExecutor(max_workers=max(1, min(COSMOS_WRITE_CONCURRENCY, len(operations)))) as pool:
+        for item_id, error in pool.map(run, operations):
+            if error is None:
+                success.append(item_id)
+            else:
+                failed.append({
+                    "id": item_id,
+                    "error": str(error),
+                    "status": getattr(error, "status_code", None)
+                })
+    return success, failed
+
+
+def _execute_single(container, partition_key, op):
+    """Traduz uma operação no formato de batch para a chamada equivalente do ContainerProxy."""
+    kind, args = op[0], op[1]
+    kwargs = dict(op[2]) if len(op) > 2 else {}
+    etag = kwargs.pop("if_match_etag", None)
+    if etag:
+        kwargs["etag"] = etag
+        kwargs["match_condition"] = MatchConditions.IfNotModified
+
+    if kind == "create":
+        return container.create_item(body=args[0], **kwargs)
+    if kind == "upsert":
+        return container.upsert_item(body=args[0], **kwargs)
+    if kind == "replace":
+        return container.replace_item(item=args[0], body=args[1], **kwargs)
+    if kind == "patch":
+        return container.patch_item(item=args[0], partition_key=partition_key,
+                                    patch_operations=args[1], **kwargs)
+    raise ValueError(f"Operação não suportada: {kind}")
+
+
+def _with_throttle_retry(call):
+    """Repete a chamada quando o Cosmos responde 429, respeitando o x-ms-retry-after-ms."""
+    for attempt in range(COSMOS_MAX_THROTTLE_RETRIES + 1):
+        try:
+            return call()
+        except CosmosHttpResponseError as e:
+            if e.status_code != 429 or attempt == COSMOS_MAX_THROTTLE_RETRIES:
+                raise
+            headers = getattr(e, "headers", None) or {}
+            retry_after_ms = headers.get("x-ms-retry-after-ms")
+            delay = float(retry_after_ms) / 1000 if retry_after_ms else 0.1 * (2 ** attempt)
+            logger.warning(f"Cosmos 429 (RU throttling); nova tentativa em {delay:.2f}s.")
+            time.sleep(delay)
@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+POSTS_CACHE_MAX_ENTRIES = int(os.getenv("POSTS_CACHE_MAX_ENTRIES", "5000"))
+POSTS_CACHE_MAX_BYTES = int(os.getenv("POSTS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+POSTS_CACHE_TTL = int(os.getenv("POSTS_CACHE_TTL", "300"))
+# Backend partilhado entre workers: vazio (só cache local) ou "local" (stand-in em memória)
+POSTS_CACHE_SHARED_BACKEND = os.getenv("POSTS_CACHE_SHARED_BACKEND", "")
+
+
+class CacheBackend:
+    """
+    Interface de um backend partilhado entre workers (ex.: Redis).
+    Os valores são dicionários serializáveis em JSON; o backend trata da expiração por TTL.
+    """
+
+    def get_many(self, keys) -> dict:
+        raise NotImplementedError
+
+    def set_many(self, entries: dict, ttl: int):
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        raise NotImplementedError
+
+
+class LocalSharedBackend(CacheBackend):
+    """Stand-in em memória do backend partilhado, para desenvolvimento e testes."""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get_many(self, keys) -> dict:
+        now = self._clock()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                expires_at, raw = entry
+                if expires_at <= now:
+                    del self._data[key]
+                    continue
+                found[key] = json.loads(raw)
+        return found
+
+    def set_many(self, entries: dict, ttl: int):
+        expires_at = self._clock() + ttl
+        with self._lock:
+            for key, value in entries.items():
+                self._data[key] = (expires_at, json.dumps(value, ensure_ascii=False))
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+class PostCache:
+    """
+    Cache read-through de posts por id: LRU local com TTL e limites de entradas e de bytes,
+    opcionalmente apoiada num backend partilhado (consultado nas falhas da cache local).
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int, shared: CacheBackend = None,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared = shared
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # id -> (expires_at, bytes, post)
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "shared_hits": 0, "evictions": 0, "invalidations": 0}
+
+    def get_many(self, ids):
+        """Devolve ({id: post} encontrados, [ids em falta])."""
+        now = self._clock()
+        found, missing = {}, []
+        with self._lock:
+            for item_id in ids:
+                entry = self._entries.get(item_id)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(item_id)
+                    found[item_id] = entry[2]
+                else:
+                    if entry is not None:
+                        self._drop(item_id)
+                    missing.append(item_id)
+
+        if missing and self.shared is not None:
+            try:
+                shared_found = self.shared.get_many(missing)
+            except Exception as e:
+                logger.warning(f"Backend partilhado da cache indisponível: {e}")
+                shared_found = {}
+            if shared_found:
+                self._put_local(shared_found)
+                found.update(shared_found)
+                missing = [item_id for item_id in missing if item_id not in shared_found]
+            with self._lock:
+                self._stats["shared_hits"] += len(shared_found)
+
+        with self._lock:
+            self._stats["hits"] += len(ids) - len(missing)
+            self._stats["misses"] += len(missing)
+        return found, missing
+
+    def set_many(self, posts: dict):
+        if not posts:
+            return
+        self._put_local(posts)
+        if self.shared is not None:
+            try:
+                self.shared.set_many(posts, self.ttl)
+            except Exception as e:
+                logger.warning(f"Backend partilhado da cache indisponível: {e}")
+
+    def invalidate(self, ids):
+        ids = list(ids)
+        with self._lock:
+            for item_id in ids:
+                if item_id in self._entries:
+                    self._drop(item_id)
+            self._stats["invalidations"] += len(ids)
+        if self.shared is not None and ids:
+            try:
+                self.shared.delete_many(ids)
+            except Exception as e:
+                logger.warning(f"Backend partilhado da cache indisponível: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._bytes}
+
+    def _put_local(self, posts: dict):
+        expires_at = self._clock() + self.ttl
+        with self._lock:
+            for item_id, post in posts.items():
+                size = len(json.dumps(post, ensure_ascii=False).encode("utf-8"))
+                if size > self.max_bytes:
+                    continue
+                if item_id in self._entries:
+                    self._drop(item_id)
+                self._entries[item_id] = (expires_at, size, post)
+                self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def _drop(self, item_id):
+        # Chamado com o lock adquirido
+        _, size, _ = self._entries.pop(item_id)
+        self._bytes -= size
+
+
+def _shared_backend_from_env():
+    if not POSTS_CACHE_SHARED_BACKEND:
+        return None
+    if POSTS_CACHE_SHARED_BACKEND == "local":
+        return LocalSharedBackend()
+    logger.warning(f"POSTS_CACHE_SHARED_BACKEND desconhecido: {POSTS_CACHE_SHARED_BACKEND}; a usar só cache local.")
+    return None
+
+
+# Instância única por worker, partilhada pelas funções que lêem ou escrevem posts
+posts_cache = PostCache(
+    max_entries=POSTS_CACHE_MAX_ENTRIES,
+    max_bytes=POSTS_CACHE_MAX_BYTES,
+    ttl=POSTS_CACHE_TTL,
+    shared=_shared_backend_from_env()
+)
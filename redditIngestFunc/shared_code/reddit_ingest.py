@@ -0,0 +1,493 @@
+import os
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from azure.core import MatchConditions
+from azure.cosmos import CosmosClient
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+from .cosmos_batch import execute_in_batches
+from .post_cache import posts_cache
+
+logger = logging.getLogger(__name__)
+
+# --- Configurações e credenciais ---
+CLIENT_ID = os.environ.get("CLIENT_ID") or os.environ.get("REDDIT_CLIENT_ID")
+CLIENT_SECRET = os.environ.get("SECRET") or os.environ.get("REDDIT_CLIENT_SECRET")
+REDDIT_USER = os.environ.get("REDDIT_USER")
+REDDIT_PASSWORD = os.environ.get("REDDIT_PASSWORD")
+
+# Endpoints do Reddit (configuráveis para testes locais contra um servidor stub)
+REDDIT_AUTH_URL = os.environ.get("REDDIT_AUTH_URL", "https://www.reddit.com/api/v1/access_token")
+REDDIT_API_BASE = os.environ.get("REDDIT_API_BASE", "https://oauth.reddit.com").rstrip("/")
+
+COSMOS_ENDPOINT = os.environ.get("COSMOS_ENDPOINT")
+COSMOS_KEY = os.environ.get("COSMOS_KEY")
+COSMOS_DATABASE = os.environ.get("COSMOS_DATABASE", "RedditApp")
+COSMOS_CONTAINER = os.environ.get("COSMOS_CONTAINER", "posts")
+
+# Segundos antes da expiração em que o token é renovado em background
+REDDIT_TOKEN_REFRESH_MARGIN = int(os.environ.get("REDDIT_TOKEN_REFRESH_MARGIN", "300"))
+
+# 429 do Reddit: número de novas tentativas e base do backoff exponencial (sem cabeçalhos de reset)
+REDDIT_MAX_THROTTLE_RETRIES = int(os.environ.get("REDDIT_MAX_THROTTLE_RETRIES", "3"))
+REDDIT_THROTTLE_BACKOFF_SECONDS = float(os.environ.get("REDDIT_THROTTLE_BACKOFF_SECONDS", "1"))
+
+# Pool de ligações HTTP keep-alive partilhado entre invocações
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "20"))
+HTTP_TIMEOUT = int(os.environ.get("HTTP_TIMEOUT", "30"))
+
+# Paginação: o Reddit devolve no máximo 100 itens por página de listagem
+REDDIT_PAGE_SIZE = 100
+MAX_INGEST_LIMIT = int(os.environ.get("MAX_INGEST_LIMIT", "5000"))
+
+# Checkpoint por subreddit/sort: número máximo de hashes de posts guardados
+CHECKPOINT_MAX_POSTS = int(os.environ.get("CHECKPOINT_MAX_POSTS", "2000"))
+
+logger.info(f"Credenciais Reddit: CLIENT_ID={'OK' if CLIENT_ID else 'MISSING'}, "
+            f"CLIENT_SECRET={'OK' if CLIENT_SECRET else 'MISSING'}, "
+            f"REDDIT_USER={'OK' if REDDIT_USER else 'MISSING'}, "
+            f"REDDIT_PASSWORD={'OK' if REDDIT_PASSWORD else 'MISSING'}")
+logger.info(f"Cosmos DB: ENDPOINT={'OK' if COSMOS_ENDPOINT else 'MISSING'}, "
+            f"KEY={'OK' if COSMOS_KEY else 'MISSING'}")
+
+# --- Clientes reutilizados entre invocações (um por worker) ---
+_clients_lock = threading.Lock()
+http_session = None
+cosmos_client = None
+cosmos_container = None
+
+
+def get_http_session() -> requests.Session:
+    """Sessão keep-alive partilhada: evita repetir o handshake TLS com o Reddit em cada pedido."""
+    global http_session
+    if http_session is None:
+        with _clients_lock:
+            if http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"User-Agent": f"{REDDIT_USER}/0.1"})
+                http_session = session
+    return http_session
+
+
+def get_cosmos_container():
+    """
+    Devolve o container de posts, criando database/container apenas na primeira chamada do worker.
+    As invocações seguintes reutilizam o mesmo CosmosClient e não repetem os pedidos de metadados.
+    """
+    global cosmos_client, cosmos_container
+    if cosmos_container is None:
+        with _clients_lock:
+            if cosmos_container is None:
+                if not COSMOS_ENDPOINT or not COSMOS_KEY:
+                    logger.error("COSMOS_ENDPOINT ou COSMOS_KEY não definidos.")
+                    raise RuntimeError("Configuração do Cosmos DB ausente.")
+                client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
+                db = client.create_database_if_not_exists(COSMOS_DATABASE)
+                container = db.create_container_if_not_exists(
+                    id=COSMOS_CONTAINER,
+                    partition_key={"path": "/subreddit"}
+                )
+                cosmos_client = client
+                cosmos_container = container
+    return cosmos_container
+
+
+def _request_token():
+    """Pede um novo access_token ao Reddit (password grant). Devolve (token, expires_in)."""
+    auth = HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET)
+    token_res = get_http_session().post(
+        REDDIT_AUTH_URL,
+        auth=auth,
+        data={
+            "grant_type": "password",
+            "username": REDDIT_USER,
+            "password": REDDIT_PASSWORD
+        },
+        timeout=HTTP_TIMEOUT
+    )
+    token_res.raise_for_status()
+    payload = token_res.json()
+    token = payload.get("access_token")
+    if not token:
+        raise RuntimeError("Não obteve access_token do Reddit.")
+    return token, int(payload.get("expires_in", 3600))
+
+
+class _RedditTokenCache:
+    """
+    Cache em memória do access_token, partilhada por todas as invocações do worker.
+    - Válido até expires_in; renovado em background quando faltam menos de `margin` segundos.
+    - Com token frio/expirado, só um pedido de renovação fica em curso; os restantes esperam por ele.
+    """
+
+    def __init__(self, fetch_token, margin: int):
+        self._fetch_token = fetch_token
+        self._margin = margin
+        self._cond = threading.Condition()
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._refreshing = False
+
+    def get(self) -> str:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._token and now < self._expires_at:
+                    if now >= self._refresh_at and not self._refreshing:
+                        self._refreshing = True
+                        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+                    return self._token
+                if not self._refreshing:
+                    self._refreshing = True
+                    break
+                # Já há uma renovação em curso: espera pelo resultado
+                self._cond.wait()
+
+        try:
+            token, expires_in = self._fetch_token()
+        except Exception:
+            with self._cond:
+                self._refreshing = False
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._store(token, expires_in)
+        return token
+
+    def invalidate(self, token: str):
+        """Descarta o token se ainda for o que está em cache (ex.: após um 401)."""
+        with self._cond:
+            if self._token == token:
+                self._token = None
+                self._expires_at = 0.0
+
+    def _refresh_in_background(self):
+        try:
+            token, expires_in = self._fetch_token()
+        except Exception as e:
+            # O token actual continua válido até expirar; o próximo get() volta a tentar
+            logger.warning(f"Falha na renovação em background do token Reddit: {e}")
+            with self._cond:
+                self._refreshing = False
+                self._cond.notify_all()
+            return
+        with self._cond:
+            self._store(token, expires_in)
+        logger.info("Token Reddit renovado em background.")
+
+    def _store(self, token: str, expires_in: int):
+        # Chamado com o lock adquirido
+        now = time.monotonic()
+        self._token = token
+        self._expires_at = now + expires_in
+        # Com expires_in curto, a margem nunca passa de metade da validade
+        self._refresh_at = now + max(expires_in - self._margin, expires_in / 2)
+        self._refreshing = False
+        self._cond.notify_all()
+
+
+_token_cache = _RedditTokenCache(_request_token, REDDIT_TOKEN_REFRESH_MARGIN)
+
+
+class _RedditRateLimiter:
+    """
+    Respeita os cabeçalhos X-Ratelimit-Remaining / X-Ratelimit-Reset do Reddit:
+    quando a quota da janela actual se esgota, espera pelo reset antes do pedido seguinte.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._remaining = None
+        self._reset_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            if self._remaining is None or self._remaining >= 1:
+                return
+            delay = self._reset_at - time.monotonic()
+        if delay > 0:
+            logger.warning(f"Quota do Reddit esgotada; a aguardar {delay:.1f}s pelo reset.")
+            time.sleep(delay)
+
+    def throttled(self, headers, attempt: int):
+        """
+        Espera depois de um 429: o Retry-After ou o X-Ratelimit-Reset da resposta, se vierem;
+        sem eles, backoff exponencial com jitter (base * 2**attempt).
+        """
+        delay = None
+        for header in ("Retry-After", "X-Ratelimit-Reset"):
+            try:
+                value = float(headers.get(header))
+            except (TypeError, ValueError):
+                continue
+            if value > 0:
+                delay = value
+                break
+        if delay is None:
+            backoff = REDDIT_THROTTLE_BACKOFF_SECONDS * (2 ** attempt)
+            delay = backoff / 2 + random.uniform(0, backoff / 2)
+        logger.warning(f"Reddit devolveu 429; nova tentativa em {delay:.2f}s.")
+        time.sleep(delay)
+
+    def update(self, headers):
+        remaining = headers.get("X-Ratelimit-Remaining")
+        reset = headers.get("X-Ratelimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            with self._lock:
+                self._remaining = float(remaining)
+                self._reset_at = time.monotonic() + float(reset)
+        except ValueError:
+            pass
+
+
+_rate_limiter = _RedditRateLimiter()
+
+
+def _get_listing(subreddit: str, sort: str, limit: int, token: str, after=None):
+    params = {"limit": limit}
+    if after:
+        params["after"] = after
+    _rate_limiter.wait()
+    res = get_http_session().get(
+        f"{REDDIT_API_BASE}/r/{subreddit}/{sort}",
+        headers={"Authorization": f"bearer {token}"},
+        params=params,
+        timeout=HTTP_TIMEOUT
+    )
+    _rate_limiter.update(res.headers)
+    return res
+
+
+def _fetch_page(subreddit: str, sort: str, limit: int, after=None):
+    """Pede uma página da listagem. Devolve (children, cursor after da página seguinte)."""
+    token = _token_cache.get()
+    res = _get_listing(subreddit, sort, limit, token, after)
+    if res.status_code == 401:
+        # Token revogado antes do expires_in: força renovação e tenta uma vez
+        logger.warning("Reddit devolveu 401; a renovar access_token.")
+        _token_cache.invalidate(token)
+        token = _token_cache.get()
+        res = _get_listing(subreddit, sort, limit, token, after)
+    # 429: espera (cabeçalhos da resposta ou backoff) e repete até REDDIT_MAX_THROTTLE_RETRIES vezes
+    attempt = 0
+    while res.status_code == 429 and attempt < REDDIT_MAX_THROTTLE_RETRIES:
+        _rate_limiter.throttled(res.headers, attempt)
+        attempt += 1
+        res = _get_listing(subreddit, sort, limit, token, after)
+    res.raise_for_status()
+    data = res.json().get("data", {})
+    children = data.get("children", [])
+    if not isinstance(children, list):
+        raise RuntimeError("Resposta inesperada da API do Reddit.")
+    return children, data.get("after")
+
+
+def _iter_listing_pages(subreddit: str, sort: str, limit: int):
+    """
+    Gerador de páginas da listagem, seguindo o cursor `after` até `limit` posts.
+    A página seguinte é pedida em background enquanto o chamador processa a actual,
+    por isso só há no máximo duas páginas em memória.
+    """
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        remaining = limit
+        future = prefetch.submit(_fetch_page, subreddit, sort, min(REDDIT_PAGE_SIZE, remaining))
+        while future is not None:
+            children, after = future.result()
+            children = children[:remaining]
+            remaining -= len(children)
+            future = None
+            if after and children and remaining > 0:
+                future = prefetch.submit(_fetch_page, subreddit, sort,
+                                         min(REDDIT_PAGE_SIZE, remaining), after)
+            yield children
+
+
+def _content_hash(item) -> str:
+    """Hash do conteúdo vindo do Reddit; muda apenas quando título, texto ou url mudam."""
+    payload = json.dumps([item["title"], item["selftext"], item["url"]], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _checkpoint_id(subreddit: str, sort: str) -> str:
+    return f"{subreddit}_checkpoint-{sort}"
+
+
+def load_checkpoint(cont, subreddit: str, sort: str):
+    """Lê o checkpoint (último fullname, timestamp e hashes por post) deste subreddit/sort."""
+    try:
+        return cont.read_item(item=_checkpoint_id(subreddit, sort), partition_key=subreddit)
+    except CosmosResourceNotFoundError:
+        return {
+            "id": _checkpoint_id(subreddit, sort),
+            "subreddit": subreddit,
+            "type": "checkpoint",
+            "sort": sort,
+            "last_fullname": None,
+            "last_ingested_at": None,
+            "hashes": {}
+        }
+
+
+def _save_checkpoint(cont, checkpoint):
+    hashes = checkpoint["hashes"]
+    if len(hashes) > CHECKPOINT_MAX_POSTS:
+        # Mantém apenas os posts vistos mais recentemente (ordem de inserção)
+        checkpoint["hashes"] = dict(list(hashes.items())[-CHECKPOINT_MAX_POSTS:])
+    etag = checkpoint.get("_etag")
+    try:
+        if etag:
+            cont.replace_item(item=checkpoint["id"], body=checkpoint,
+                              etag=etag, match_condition=MatchConditions.IfNotModified)
+        else:
+            cont.create_item(body=checkpoint)
+    except Exception as e:
+        # Outra ingestão gravou o checkpoint entretanto; a próxima reconcilia pelos content_hash
+        logger.warning(f"Checkpoint {checkpoint['id']} não gravado: {e}")
+
+
+def _stored_hashes(cont, subreddit: str, ids):
+    """content_hash e _etag dos ids (da mesma partição) que já existem no Cosmos."""
+    if not ids:
+        return {}
+    rows = cont.query_items(
+        query="SELECT c.id, c.content_hash, c._etag FROM c WHERE ARRAY_CONTAINS(@ids, c.id)",
+        parameters=[{"name": "@ids", "value": list(ids)}],
+        partition_key=subreddit
+    )
+    return {row["id"]: row for row in rows}
+
+
+def _to_item(subreddit: str, child):
+    d = child.get("data", {})
+    rid = d.get("id")
+    if not rid:
+        return None
+
+    title = d.get("title", "") or ""
+    selftext = d.get("selftext", "") or ""
+
+    item = {
+        "id": f"{subreddit}_{rid}",
+        "subreddit": subreddit,
+        "title": title,
+        "selftext": selftext,
+        "url": d.get("url", "")
+    }
+    item["content_hash"] = _content_hash(item)
+    return item
+
+
+def _write_changed(cont, subreddit: str, items, checkpoint, stop_at_existing: bool):
+    """
+    Grava só os posts novos ou alterados de uma página.
+    - novos: create (falha com 409 se outro processo o criou entretanto);
+    - alterados: patch condicionado ao _etag lido, preservando campos da análise;
+    - iguais ao checkpoint ou ao content_hash guardado: não são escritos.
+    Devolve (itens processados, falhados, novos, alterados, inalterados, encontrou_existente).
+    """
+    hashes = checkpoint["hashes"]
+    unchanged = [item for item in items if hashes.get(item["id"]) == item["content_hash"]]
+    unchanged_ids = {item["id"] for item in unchanged}
+    stored = _stored_hashes(cont, subreddit, [item["id"] for item in items if item["id"] not in unchanged_ids])
+
+    reached_existing = False
+    if stop_at_existing:
+        for pos, item in enumerate(items):
+            if item["id"] in unchanged_ids or item["id"] in stored:
+                items = items[:pos]
+                reached_existing = True
+                break
+
+    now = int(time.time())
+    new_ids, updated_ids, unchanged_ids_out, operations = [], [], [], []
+    for item in items:
+        row = stored.get(item["id"])
+        if item["id"] in unchanged_ids or (row and row.get("content_hash") == item["content_hash"]):
+            unchanged_ids_out.append(item["id"])
+        elif row is None:
+            operations.append((item["id"], ("create", ({**item, "ingested_at": now},))))
+            new_ids.append(item["id"])
+        else:
+            patch_ops = [
+                {"op": "set", "path": "/title", "value": item["title"]},
+                {"op": "set", "path": "/selftext", "value": item["selftext"]},
+                {"op": "set", "path": "/url", "value": item["url"]},
+                {"op": "set", "path": "/content_hash", "value": item["content_hash"]},
+                {"op": "set", "path": "/ingested_at", "value": now},
+                # O texto mudou: a tradução guardada deixa de ser válida
+                {"op": "set", "path": "/text_to_analyse", "value": ""},
+            ]
+            operations.append((item["id"], ("patch", (item["id"], patch_ops), {"if_match_etag": row["_etag"]})))
+            updated_ids.append(item["id"])
+
+    written_ids, failed = execute_in_batches(cont, subreddit, operations)
+    written = set(written_ids)
+    new_ids = [i for i in new_ids if i in written]
+    updated_ids = [i for i in updated_ids if i in written]
+    posts_cache.invalidate(updated_ids)
+
+    ok = written.union(unchanged_ids_out)
+    processed = [item for item in items if item["id"] in ok]
+    for item in processed:
+        hashes.pop(item["id"], None)
+        hashes[item["id"]] = item["content_hash"]
+    return processed, failed, new_ids, updated_ids, unchanged_ids_out, reached_existing
+
+
+def fetch_and_store(subreddit: str, sort: str, limit: int, stop_at_existing: bool = False):
+    """
+    Percorre a listagem do Reddit página a página e grava no Cosmos apenas os posts novos
+    ou alterados desde o último checkpoint deste subreddit/sort, em transactional batches
+    (todos os posts partilham a partition key /subreddit).
+    Com `stop_at_existing`, pára no primeiro post que já esteja no Cosmos.
+    Devolve (posts, falhados, {"new": [...], "updated": [...], "unchanged": [...]}).
+    """
+    cont = get_cosmos_container()
+    checkpoint = load_checkpoint(cont, subreddit, sort)
+
+    posts, failed = [], []
+    changes = {"new": [], "updated": [], "unchanged": []}
+    first_fullname = None
+    pages = _iter_listing_pages(subreddit, sort, limit)
+    for children in pages:
+        items = [item for item in (_to_item(subreddit, c) for c in children) if item]
+        if first_fullname is None and items:
+            first_fullname = f"t3_{items[0]['id'].split('_', 1)[1]}"
+
+        processed, page_failed, new_ids, updated_ids, unchanged_ids, reached_existing = _write_changed(
+            cont, subreddit, items, checkpoint, stop_at_existing
+        )
+        logger.info(f"✅ '{subreddit}': {len(new_ids)} novos, {len(updated_ids)} actualizados, "
+                    f"{len(unchanged_ids)} inalterados, {len(page_failed)} falhados")
+        posts.extend(processed)
+        failed.extend(page_failed)
+        changes["new"].extend(new_ids)
+        changes["updated"].extend(updated_ids)
+        changes["unchanged"].extend(unchanged_ids)
+
+        if reached_existing:
+            logger.info(f"Encontrado post já ingerido em '{subreddit}'; paginação terminada.")
+            pages.close()
+            break
+
+    if first_fullname:
+        checkpoint["last_fullname"] = first_fullname
+    checkpoint["last_ingested_at"] = int(time.time())
+    _save_checkpoint(cont, checkpoint)
+
+    return posts, failed, changes
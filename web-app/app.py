@@ -1,32 +1,39 @@
 import os
+import json
 import logging
+import multiprocessing
 import re
 from datetime import datetime
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.stats import gaussian_kde
-from wordcloud import WordCloud, STOPWORDS
-from transformers import pipeline
 
 import requests
-from flask import Flask, render_template, request, flash, redirect, url_for, session
-from azure.storage.blob import BlobClient, ContainerClient, ContentSettings
-
-from azure.cosmos import CosmosClient
-
-# Liga ao Cosmos uma vez ao iniciar a app
+from flask import Flask, render_template, request, flash, redirect, url_for, session, jsonify, abort, make_response
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContainerClient
+
+from blob_index import ReportIndex, dated_name
+from charts import ChartService
+from components import LazyComponent, load_all, start_warmup
+from cosmos_writes import patch_posts
+from inference import SENTIMENT_LABELS, load_engine
+from jobs import JobManager, NullProgress, job_key
+from reports import ReportPublisher, build_pdf
+from result_store import ResultStore
+from scoring import SCORING_URL, RemoteSentimentEngine, ScoringPool
+from terms import merge_frequencies, term_frequencies
+from translation import TranslationService, text_hash
+
+# Cosmos
 COSMOS_ENDPOINT = os.getenv("COSMOS_ENDPOINT")
 COSMOS_KEY = os.getenv("COSMOS_KEY")
 COSMOS_DATABASE = os.getenv("COSMOS_DATABASE", "RedditApp")
 COSMOS_CONTAINER = os.getenv("COSMOS_CONTAINER", "posts")
 
-assert COSMOS_ENDPOINT and COSMOS_KEY, "Falta o Cosmos Endpoint ou Key"
-
-cosmos_client = CosmosClient(COSMOS_ENDPOINT, credential=COSMOS_KEY)
-db_client = cosmos_client.get_database_client(COSMOS_DATABASE)
-cont_client = db_client.get_container_client(COSMOS_CONTAINER)
+# Arranque: "lazy" adia os imports pesados, o modelo e a ligação ao Cosmos até ao primeiro uso
+# (com STARTUP_WARMUP, carregam logo num thread em background); "eager" carrega tudo no import
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy").lower()
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -46,79 +53,210 @@ app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
 FUNCTION_URL = os.getenv("FUNCTION_URL")        # e.g. https://<sua-func>.azurewebsites.net/api/search?code=...
 GET_POSTS_FUNCTION_URL = os.getenv("GET_POSTS_FUNCTION_URL")  # e.g. https://<sua-func>.azurewebsites.net/api/getposts?code=...
 CONTAINER_ENDPOINT_SAS = os.getenv("CONTAINER_ENDPOINT_SAS")  # e.g. https://<storage>.blob.core.windows.net/<container>?<sas>
+# Acima deste tamanho, a lista de ids segue no corpo de um POST em vez da query string
+GET_IDS_MAX_CHARS = int(os.getenv("GET_IDS_MAX_CHARS", "1500"))
+# Tempo máximo que /charts/<nome> espera por um gráfico ainda a ser desenhado
+CHART_WAIT_SECONDS = int(os.getenv("CHART_WAIT_SECONDS", "60"))
+CHART_NAME_RE = re.compile(r"[0-9a-f]{64}\.(png|webp)")
+# Posts brutos guardados com a pesquisa (só fallback se o Cosmos falhar): campos usados pela
+# análise e pelo template, com o selftext cortado
+RAW_POST_FIELDS = ("full_id", "id", "subreddit", "title", "selftext", "url", "author", "created_utc")
+RAW_POST_TEXT_MAX_CHARS = int(os.getenv("RAW_POST_TEXT_MAX_CHARS", "2000"))
+
+# Jobs de análise assíncrona (/detail_all/jobs): fila em processo por omissão
+job_manager = JobManager(
+    max_workers=int(os.getenv("ANALYSIS_JOB_WORKERS", "2")),
+    result_ttl=int(os.getenv("ANALYSIS_RESULT_TTL", "3600"))
+)
+
+# Ids e posts brutos de cada pesquisa ficam no servidor (LRU em processo por omissão);
+# o cookie da sessão só leva o search_id
+result_store = ResultStore()
+
+# Inicializar motor de análise de sentimento: serviço de scoring local (SCORING_URL), pool de
+# processos próprio (SCORING_MODE=pool) ou modelo carregado neste processo
+SCORING_MODE = os.getenv("SCORING_MODE", "inprocess").lower()
+
+
+def _connect_cosmos():
+    """Liga ao Cosmos uma vez; devolve o cliente da base de dados."""
+    from azure.cosmos import CosmosClient
+
+    if not (COSMOS_ENDPOINT and COSMOS_KEY):
+        raise RuntimeError("Falta o Cosmos Endpoint ou Key")
+    client = CosmosClient(COSMOS_ENDPOINT, credential=COSMOS_KEY)
+    return client.get_database_client(COSMOS_DATABASE)
+
+
+def _load_classifier():
+    if SCORING_URL:
+        return RemoteSentimentEngine(SCORING_URL).start()
+    if SCORING_MODE == "pool":
+        return ScoringPool().start()
+    return load_engine()
+
+
+def _load_translator():
+    # Sem Cosmos (configuração em falta ou indisponível) a tradução funciona só com a cache local
+    try:
+        database = cosmos_db.get()
+    except Exception as e:
+        logger.warning(f"Cache de traduções no Cosmos indisponível, a usar só a cache local: {e}")
+        database = None
+    return TranslationService(database)
+
 
-# Inicializar pipeline de análise de sentimento (sentiment-analysis padrão, leve)
-try:
-    classifier = pipeline("sentiment-analysis")
-    logger.info("Pipeline de sentiment-analysis carregado com sucesso.")
-except Exception as e:
-    logger.error("Falha ao inicializar pipeline de sentiment-analysis: %s", e, exc_info=True)
-    classifier = None
+cosmos_db = LazyComponent("cosmos", _connect_cosmos)
+# Tradução com cache por hash do texto (SQLite local + container de traduções no Cosmos)
+translator = LazyComponent("translator", _load_translator)
+sentiment_engine = LazyComponent("sentiment", _load_classifier)
+charts = LazyComponent("charts", ChartService)
+COMPONENTS = (cosmos_db, translator, sentiment_engine, charts)
+
+
+def _connect_blob_container():
+    if not CONTAINER_ENDPOINT_SAS:
+        raise RuntimeError("CONTAINER_ENDPOINT_SAS inválido ou ausente.")
+    return ContainerClient.from_container_url(CONTAINER_ENDPOINT_SAS)
+
+
+# Um só ContainerClient (pool de ligações HTTP) para os relatórios e a listagem de ficheiros
+blob_container = LazyComponent("blob", _connect_blob_container)
+report_publisher = LazyComponent("reports", lambda: ReportPublisher(blob_container.get()))
+report_index = LazyComponent("report_index", lambda: ReportIndex(blob_container.get()))
+
+# Os workers do ScoringPool (spawn) reimportam este módulo: só o processo principal carrega
+if multiprocessing.parent_process() is None:
+    if STARTUP_MODE == "eager":
+        load_all(COMPONENTS)
+    elif STARTUP_WARMUP:
+        start_warmup(COMPONENTS)
+
+def iter_ndjson(resp):
+    """Parser incremental de uma resposta NDJSON em streaming: gera um objecto por linha."""
+    for line in resp.iter_lines(decode_unicode=True):
+        if line:
+            yield json.loads(line)
 
 def fetch_and_ingest_posts(subreddit: str, sort: str, limit: int):
     """
     Chama a Azure Function que ingere do Reddit e retorna lista de posts.
-    Espera que a Azure Function retorne JSON com chave "posts": [...], ou liste diretamente.
+    Pede a resposta em NDJSON (um post por linha, mais uma linha final de resumo),
+    lida incrementalmente em vez de carregar o payload inteiro com resp.json().
     """
     if not FUNCTION_URL:
         raise RuntimeError("FUNCTION_URL não está configurado")
-    params = {"subreddit": subreddit, "sort": sort, "limit": limit}
+    params = {"subreddit": subreddit, "sort": sort, "limit": limit, "format": "ndjson"}
     logger.info(f"[fetch_and_ingest_posts] Chamando FUNCTION_URL={FUNCTION_URL} com params={params}")
-    resp = requests.get(FUNCTION_URL, params=params, timeout=30)
+    resp = requests.get(FUNCTION_URL, params=params, timeout=30, stream=True)
     try:
         resp.raise_for_status()
     except Exception:
         logger.error(f"[fetch_and_ingest_posts] Status code != 200: {resp.status_code}, body: {resp.text}")
         resp.raise_for_status()
-    data = resp.json()
-    # Tenta extrair key "posts", mas aceita caso retorne lista diretamente
-    if isinstance(data, dict) and "posts" in data and isinstance(data["posts"], list):
-        posts = data["posts"]
-    elif isinstance(data, list):
-        posts = data
-    else:
-        logger.warning(f"[fetch_and_ingest_posts] JSON inesperado: {data!r}")
-        posts = []
+    posts = []
+    for entry in iter_ndjson(resp):
+        if "summary" in entry:
+            summary = entry["summary"]
+            logger.info(f"[fetch_and_ingest_posts] Resumo: {len(summary.get('new', []))} novos, "
+                        f"{len(summary.get('updated', []))} actualizados, {len(summary.get('failed', []))} falhados")
+        else:
+            posts.append(entry)
     logger.info(f"[fetch_and_ingest_posts] Recebeu {len(posts)} posts")
     return posts
 
-def get_posts_from_cosmos(ids: list[str]):
+def fetch_and_ingest_many(subreddits: list[str], sort: str, limit: int):
+    """
+    Ingestão em batch: um único pedido à Azure Function para vários subreddits, que os
+    ingere em paralelo. A resposta é NDJSON, uma linha por subreddit.
+    Devolve (posts de todos os subreddits, {subreddit: erro}).
+    """
+    if not FUNCTION_URL:
+        raise RuntimeError("FUNCTION_URL não está configurado")
+    payload = {"subreddits": subreddits, "sort": sort, "limit": limit}
+    logger.info(f"[fetch_and_ingest_many] Chamando FUNCTION_URL={FUNCTION_URL} com {payload}")
+    resp = requests.post(FUNCTION_URL, json=payload, timeout=120, stream=True)
+    try:
+        resp.raise_for_status()
+    except Exception:
+        logger.error(f"[fetch_and_ingest_many] Status code != 200: {resp.status_code}, body: {resp.text}")
+        resp.raise_for_status()
+    posts, errors = [], {}
+    for entry in iter_ndjson(resp):
+        name = entry.get("subreddit")
+        if "error" in entry:
+            logger.warning(f"[fetch_and_ingest_many] Falha em '{name}': {entry['error']}")
+            errors[name] = entry["error"]
+            continue
+        logger.info(f"[fetch_and_ingest_many] '{name}': {len(entry.get('posts', []))} posts")
+        posts.extend(entry.get("posts", []))
+    return posts, errors
+
+def iter_posts_from_cosmos(ids: list[str]):
     """
-    Chama a Azure Function GET_POSTS com query param "ids=id1,id2,...", retorna lista de posts do Cosmos.
-    Espera que a resposta JSON seja {"posts": [...]} ou lista diretamente.
+    Chama a Azure Function GET_POSTS em modo NDJSON e gera os posts à medida que chegam.
+    Listas de ids curtas vão na query string ("ids=id1,id2,..."); as longas vão no corpo de um POST.
     """
     if not GET_POSTS_FUNCTION_URL:
         raise RuntimeError("GET_POSTS_FUNCTION_URL não está configurado")
     if not ids:
-        return []
+        return
     ids_param = ",".join(ids)
-    logger.info(f"[get_posts_from_cosmos] Chamando GET_POSTS_FUNCTION_URL={GET_POSTS_FUNCTION_URL} com ids={ids_param}")
-    resp = requests.get(GET_POSTS_FUNCTION_URL, params={"ids": ids_param}, timeout=30)
+    logger.info(f"[get_posts_from_cosmos] Chamando GET_POSTS_FUNCTION_URL={GET_POSTS_FUNCTION_URL} com {len(ids)} ids")
+    if len(ids_param) <= GET_IDS_MAX_CHARS:
+        resp = requests.get(GET_POSTS_FUNCTION_URL, params={"ids": ids_param, "format": "ndjson"},
+                            timeout=30, stream=True)
+    else:
+        resp = requests.post(GET_POSTS_FUNCTION_URL, json={"ids": ids, "format": "ndjson"},
+                             timeout=30, stream=True)
     try:
         resp.raise_for_status()
     except Exception:
         logger.error(f"[get_posts_from_cosmos] Status code != 200: {resp.status_code}, body: {resp.text}")
         resp.raise_for_status()
-    data = resp.json()
-    if isinstance(data, dict) and "posts" in data and isinstance(data["posts"], list):
-        posts = data["posts"]
-    elif isinstance(data, list):
-        posts = data
-    else:
-        logger.warning(f"[get_posts_from_cosmos] JSON inesperado: {data!r}")
-        posts = []
+    yield from iter_ndjson(resp)
+
+def get_posts_from_cosmos(ids: list[str]):
+    """Lista dos posts do Cosmos para os ids dados (ver iter_posts_from_cosmos)."""
+    posts = list(iter_posts_from_cosmos(ids))
     logger.info(f"[get_posts_from_cosmos] Recebeu {len(posts)} posts do Cosmos")
     return posts
 
+def invalidate_posts_cache(ids: list[str]):
+    """
+    Pede à Azure Function GET_POSTS que esqueça estes posts da cache de leitura: a análise grava
+    directamente no Cosmos, e sem isto a análise seguinte receberia os documentos anteriores.
+    """
+    if not GET_POSTS_FUNCTION_URL or not ids:
+        return
+    try:
+        resp = requests.post(GET_POSTS_FUNCTION_URL, json={"invalidate": list(ids)}, timeout=10)
+        resp.raise_for_status()
+    except Exception as e:
+        logger.warning(f"[invalidate_posts_cache] Falha ao invalidar {len(ids)} posts na cache: {e}")
+
 @app.route("/", methods=["GET"])
 def home():
     # Limpa sessão de pesquisas anteriores
-    session.pop("post_ids", None)
+    result_store.delete(session.pop("search_id", None))
     session.pop("search_params", None)
-    session.pop("posts_raw", None)
     # Passa valores padrão para campos do formulário
     return render_template("index.html", posts=None, subreddit="", sort="hot", limit=10)
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness: estado de cada componente. Com carregamento antecipado (eager ou warm-up) só fica
+    pronto quando todos carregarem; em lazy puro basta que nenhum tenha falhado.
+    """
+    components = {c.name: c.status() for c in COMPONENTS}
+    if STARTUP_MODE == "eager" or STARTUP_WARMUP:
+        is_ready = all(c.loaded for c in COMPONENTS)
+    else:
+        is_ready = not any(c.error for c in COMPONENTS)
+    return jsonify({"ready": is_ready, "startup_mode": STARTUP_MODE, "warmup": STARTUP_WARMUP,
+                    "components": components}), 200 if is_ready else 503
+
 @app.route("/search", methods=["GET"])
 def search():
     subreddit = request.args.get("subreddit", "").strip()
@@ -134,9 +272,15 @@ def search():
         flash("O campo 'Número de posts' deve ser um número inteiro.", "warning")
         return redirect(url_for("home"))
 
-    # 1) Chama ingestão do Reddit → Cosmos
+    # 1) Chama ingestão do Reddit → Cosmos (vários subreddits separados por vírgula → modo batch)
+    subreddits = [s.strip() for s in subreddit.split(",") if s.strip()]
     try:
-        posts = fetch_and_ingest_posts(subreddit, sort, limit)
+        if len(subreddits) > 1:
+            posts, errors = fetch_and_ingest_many(subreddits, sort, limit)
+            for name, error in errors.items():
+                flash(f"Erro ao obter posts de r/{name}: {error}", "warning")
+        else:
+            posts = fetch_and_ingest_posts(subreddit, sort, limit)
         logger.info(f"[SEARCH] fetch_and_ingest_posts retornou tipo {type(posts)}, len={len(posts)}")
     except Exception as e:
         logger.error(f"Erro ao obter/ingerir posts do Reddit: {e}", exc_info=True)
@@ -165,18 +309,19 @@ def search():
         flash("Nenhum post válido retornado da ingestão.", "warning")
         return redirect(url_for("home"))
 
-    # 3) Salva na sessão, adicionando log dos IDs
+    # 3) Salva no result_store (a sessão só guarda o id da pesquisa), adicionando log dos IDs
     max_show = 20
     if len(post_ids) > max_show:
         logger.info(f"[SEARCH] IDs a armazenar na sessão (mostrando apenas os {max_show} primeiros de {len(post_ids)}): {post_ids[:max_show]} ...")
     else:
         logger.info(f"[SEARCH] IDs a armazenar na sessão: {post_ids}")
-    session["post_ids"] = post_ids
+    # Posts brutos (reduzidos) guardados como fallback do detail_all se o Cosmos falhar
+    # Atenção: devem ser serializáveis (dicts, listas, strings, ints) para um backend partilhado
+    result_store.delete(session.get("search_id"))
+    search_id = result_store.create(post_ids=post_ids, posts_raw=[compact_post(p) for p in posts_with_full])
+    session["search_id"] = search_id
     session["search_params"] = {"subreddit": subreddit, "sort": sort, "limit": limit}
-    # Armazena posts brutos para uso no detail_all sem nova chamada externa
-    # Atenção: deve ser serializável (dicts, listas, strings, ints)
-    session["posts_raw"] = posts_with_full
-    logger.info(f"[SEARCH] session['post_ids'] salvo (total {len(post_ids)} IDs) e session['posts_raw'].")
+    logger.info(f"[SEARCH] Pesquisa {search_id} guardada (total {len(post_ids)} IDs e posts brutos).")
 
     # 4) Buscar dados completos via Cosmos usando os IDs completos
     try:
@@ -207,34 +352,53 @@ def search():
                            sort=sort,
                            limit=limit)
 
-@app.route("/detail_all", methods=["POST"])
-def detail_all():
-    import seaborn as sns
-    from wordcloud import WordCloud, STOPWORDS
-    import matplotlib.pyplot as plt
+class AnalysisError(Exception):
+    """Erro que impede a análise (ex.: sem posts ou sem pipeline); a mensagem é mostrada ao utilizador."""
 
-    # --- 0️⃣ Ambiente Cosmos
-    cosmos_client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
-    db_client = cosmos_client.get_database_client(COSMOS_DATABASE)
-    cont_client = db_client.get_container_client(COSMOS_CONTAINER)
 
-    # --- 1️⃣ IDs
+def compact_post(post: dict) -> dict:
+    """Versão reduzida de um post bruto para guardar no result_store."""
+    compact = {field: post[field] for field in RAW_POST_FIELDS if post.get(field) is not None}
+    if compact.get("selftext"):
+        compact["selftext"] = compact["selftext"][:RAW_POST_TEXT_MAX_CHARS]
+    return compact
+
+
+def current_search() -> dict:
+    """Pesquisa desta sessão no result_store ({"post_ids", "posts_raw"}), ou {} se expirou."""
+    return result_store.get(session.get("search_id"))
+
+
+def collect_post_ids():
+    """IDs a analisar: os do formulário (guardados na pesquisa) ou, na falta deles, os da última pesquisa."""
     ids_form = request.form.getlist('ids[]') or request.form.getlist('ids')
     if ids_form:
-        post_ids = ids_form
-        session["post_ids"] = post_ids
-    else:
-        post_ids = session.get("post_ids", [])
+        result_store.update(session.get("search_id"), post_ids=ids_form)
+        return ids_form
+    return current_search().get("post_ids", [])
 
-    if not post_ids:
-        flash("Nenhum post disponível para análise.", "warning")
-        return redirect(url_for("home"))
 
-    if classifier is None:
-        flash("Pipeline de sentimento não está disponível.", "danger")
-        return redirect(url_for("home"))
+def run_detail_analysis(post_ids, raw_posts=None, progress=None):
+    """
+    Pipeline da análise completa: posts do Cosmos → tradução → sentimento → gravação no Cosmos → gráficos.
+    Não depende do contexto do pedido Flask, para poder correr num worker de jobs.
+    `progress` (ver jobs.JobProgress) recebe o avanço de cada etapa e resultados parciais.
+    Devolve {"posts", "resumo", "resumo_chart", "wc_chart", "warnings"}.
+    """
+    progress = progress or NullProgress()
+    warnings = []
+
+    try:
+        classifier = sentiment_engine.get()
+    except Exception:
+        raise AnalysisError("Pipeline de sentimento não está disponível.")
+    model_version = classifier.model_id
+
+    # Campos a gravar por post ({id: {campo: valor}}): tradução e sentimento seguem no mesmo patch
+    pending_writes = {}
 
     # --- 2️⃣ Buscar posts do Cosmos
+    progress.start("posts", total=len(post_ids))
     try:
         posts = get_posts_from_cosmos(post_ids)
     except Exception as e:
@@ -242,213 +406,281 @@ def detail_all():
         posts = []
 
     if not posts:
-        raw_posts = session.get("posts_raw", [])
-        posts = [p.copy() for p in raw_posts if p.get('full_id') in post_ids]
+        posts = [p.copy() for p in (raw_posts or []) if p.get('full_id') in post_ids]
 
     if not posts:
-        flash("Não há posts para análise.", "warning")
-        return redirect(url_for("home"))
+        raise AnalysisError("Não há posts para análise.")
+    progress.finish("posts", done=len(posts))
 
     # --- 3️⃣ Detectar + traduzir se necessário, guardar text_to_analyse no Cosmos se não existir
-    analysed_posts = []
     texts = []
     posts_index = []
-    neg_probs, neu_probs, pos_probs = [], [], []
-    text_accum = []
-
-    # Credenciais Translator
-    TRANSLATOR_KEY = os.getenv("TRANSLATOR_KEY")
-    TRANSLATOR_ENDPOINT = os.getenv("TRANSLATOR_ENDPOINT")
-    TRANSLATOR_REGION = os.getenv("TRANSLATOR_REGION", "westeurope")
-
-    def detect_language(text):
-        url = TRANSLATOR_ENDPOINT + "/detect"
-        headers = {
-            'Ocp-Apim-Subscription-Key': TRANSLATOR_KEY,
-            'Ocp-Apim-Subscription-Region': TRANSLATOR_REGION,
-            'Content-Type': 'application/json'
-        }
-        body = [{'text': text}]
-        resp = requests.post(url, params={'api-version': '3.0'}, headers=headers, json=body)
-        resp.raise_for_status()
-        return resp.json()[0]['language']
-
-    def translate_to_english(text, from_lang=None):
-        url = TRANSLATOR_ENDPOINT + "/translate"
-        headers = {
-            'Ocp-Apim-Subscription-Key': TRANSLATOR_KEY,
-            'Ocp-Apim-Subscription-Region': TRANSLATOR_REGION,
-            'Content-Type': 'application/json'
-        }
-        params = {'api-version': '3.0', 'to': ['en']}
-        if from_lang:
-            params['from'] = from_lang
-        body = [{'text': text}]
-        resp = requests.post(url, params=params, headers=headers, json=body)
-        resp.raise_for_status()
-        return resp.json()[0]['translations'][0]['text']
+    post_terms = []  # contagens de termos de cada post, para a nuvem de palavras
 
+    # Posts sem text_to_analyse: traduz em conjunto (a cache evita repetir textos já traduzidos)
+    snippets = {}
+    to_translate = []
     for idx, post in enumerate(posts):
         # 1️⃣ Usa text_to_analyse se já existir
-        snippet = post.get('text_to_analyse', '').strip()
+        snippet = (post.get('text_to_analyse') or '').strip()
+        if snippet:
+            snippets[idx] = snippet
+            continue
+        base_text = (post.get('selftext') or '').strip() or (post.get('title') or '').strip()
+        if base_text:
+            to_translate.append((idx, base_text))
+
+    # 2️⃣ Caso não exista, traduz e guarda no Cosmos
+    progress.start("translation", total=len(to_translate))
+    try:
+        translations = translator.get().translate_many([text for _, text in to_translate])
+    except Exception as e:
+        logger.error(f"Erro na tradução em detail_all: {e}", exc_info=True)
+        translations = [None] * len(to_translate)
+    for done, ((idx, base_text), translated) in enumerate(zip(to_translate, translations), start=1):
+        progress.update("translation", done)
+        if translated is None:
+            snippets[idx] = base_text  # fallback
+            continue
+        snippets[idx] = translated
+        full_id = posts[idx].get('id') or posts[idx].get('full_id')
+        if full_id:
+            pending_writes.setdefault(full_id, {})["text_to_analyse"] = translated
+    progress.finish("translation")
+
+    # Distribuição (Negative, Neutral, Positive), categoria e confiança de cada post num só array;
+    # categoria -1 = sem resultado (sem texto ou falha do modelo)
+    dist = np.zeros((len(posts), len(SENTIMENT_LABELS)), dtype=np.float32)
+    classes = np.full(len(posts), -1)
+    confidence = np.zeros(len(posts))
+
+    reused = 0
+    for idx, post in enumerate(posts):
+        snippet = snippets.get(idx, '')
 
-        # 2️⃣ Caso não exista, detecta + traduz e guarda no Cosmos
+        # 3️⃣ Se ainda assim nada, pula sentimento
         if not snippet:
-            base_text = post.get('selftext', '').strip() or post.get('title', '').strip()
-            if base_text:
-                try:
-                    detected = detect_language(base_text)
-                    snippet = translate_to_english(base_text, from_lang=detected)
-                    # Guardar de volta no Cosmos
-                    full_id = post.get('id') or post.get('full_id')
-                    if full_id and "_" in full_id:
-                        query = f"SELECT * FROM c WHERE c.id = '{full_id}'"
-                        items = list(cont_client.query_items(query=query, enable_cross_partition_query=True))
-                        if items:
-                            item = items[0]
-                            item["text_to_analyse"] = snippet
-                            cont_client.replace_item(item=item['id'], body=item)
-                            logger.info(f"✅ text_to_analyse guardado no Cosmos: {full_id}")
-                except Exception as e:
-                    logger.error(f"Erro ao traduzir/detectar idioma: {e}", exc_info=True)
-                    snippet = base_text  # fallback
+            continue
 
-        # 3️⃣ Se ainda assim nada, pula sentimento
-        if snippet:
-            snippet = snippet[:512]
-            texts.append(snippet)
-            posts_index.append(idx)
+        snippet = snippet[:512]
+        input_hash = text_hash(snippet)
+
+        # Termos do post: calculados uma vez por texto e guardados no documento
+        if post.get('termos') and post.get('sentimento_hash') == input_hash:
+            post_terms.append(post['termos'])
         else:
-            post['sentimento'] = 'Unknown'
-            post['probabilidade'] = 0
-            analysed_posts.append(post)
+            terms = term_frequencies(snippet)
+            post_terms.append(terms)
+            full_id = post.get('id') or post.get('full_id')
+            if full_id:
+                pending_writes.setdefault(full_id, {})["termos"] = terms
+
+        # Resultado guardado pelo mesmo modelo para o mesmo texto: reaproveita sem classificar
+        if (post.get('sentimento') in SENTIMENT_LABELS and post.get('confiabilidade') is not None
+                and post.get('sentimento_modelo') == model_version
+                and post.get('sentimento_hash') == input_hash):
+            classes[idx] = SENTIMENT_LABELS.index(post['sentimento'])
+            confidence[idx] = float(post['confiabilidade'])
+            if post.get('sentimento_probs'):
+                dist[idx] = post['sentimento_probs']
+            reused += 1
+            continue
+
+        post['sentimento_hash'] = input_hash
+        texts.append(snippet)
+        posts_index.append(idx)
+
+    logger.info(f"[DETAIL_ALL] {reused} resultados reaproveitados do Cosmos, {len(texts)} posts a classificar")
+
+    def apply_results(indices):
+        for i in indices:
+            post = posts[i]
+            if classes[i] < 0:
+                post['sentimento'] = 'Unknown'
+                post['probabilidade'] = 0
+            else:
+                post['sentimento'] = SENTIMENT_LABELS[classes[i]]
+                post['probabilidade'] = round(float(confidence[i]) * 100, 1)
+
+    pending = set(posts_index)
+    apply_results(i for i in range(len(posts)) if i not in pending)
 
     # --- 4️⃣ Sentimento por batch
-    batch_size = 16
+    progress.start("sentiment", total=len(texts))
+    classified = np.zeros(len(posts), dtype=bool)
+    # Blocos de várias batches: o motor ordena cada bloco por comprimento antes de formar as batches
+    batch_size = classifier.batch_size * 4
     for start in range(0, len(texts), batch_size):
         batch_texts = texts[start:start+batch_size]
+        batch_index = np.array(posts_index[start:start+batch_size])
         try:
-            results = classifier(batch_texts, truncation=True)
+            batch_dist = classifier.predict_distribution(batch_texts)
+            dist[batch_index] = batch_dist
+            classes[batch_index], confidence[batch_index] = classifier.classify(batch_dist)
+            classified[batch_index] = True
         except Exception as e:
             logger.error(f"Erro no batch de sentimento: {e}", exc_info=True)
-            results = [{} for _ in batch_texts]
-
-        for j, res in enumerate(results):
-            idx = posts_index[start + j]
-            post = posts[idx]
-            label = res.get('label', 'Unknown')
-            score = res.get('score', 0.0)
-            prob = int(score * 100)
-            label_cap = label.capitalize() if isinstance(label, str) else 'Unknown'
-
-            post['sentimento'] = label_cap
-            post['probabilidade'] = prob
-
-            if label.lower() == 'negative':
-                neg_probs.append(prob)
-            elif label.lower() == 'positive':
-                pos_probs.append(prob)
-            else:
-                neu_probs.append(prob)
 
-            text_accum.append(batch_texts[j])
-            analysed_posts.append(post)
+        progress.update("sentiment", min(start + batch_size, len(texts)))
+        apply_results(batch_index)
+        progress.partial("posts", [
+            {"id": p.get('id') or p.get('full_id'), "title": p.get('title'),
+             "sentimento": p['sentimento'], "probabilidade": p['probabilidade']}
+            for p in posts if 'probabilidade' in p
+        ])
+    progress.finish("sentiment")
+
+    # Agregados por categoria, vectorizados: número de posts e confiança média (%)
+    scored = classes >= 0
+    counts = np.bincount(classes[scored], minlength=len(SENTIMENT_LABELS))
+    conf_sums = np.bincount(classes[scored], weights=confidence[scored], minlength=len(SENTIMENT_LABELS))
+    avg_confidence = np.divide(conf_sums * 100, counts, out=np.zeros(len(counts)), where=counts > 0)
+
+    # --- 5️⃣ Guardar tradução + sentimento no Cosmos (só os posts traduzidos/classificados agora)
+    for idx in np.flatnonzero(classified):
+        post = posts[idx]
+        full_id = post.get('id') or post.get('full_id')
+        if full_id:
+            pending_writes.setdefault(full_id, {}).update({
+                "sentimento": post['sentimento'],
+                "confiabilidade": round(float(confidence[idx]), 4),
+                "sentimento_probs": [round(float(p), 4) for p in dist[idx]],
+                "sentimento_modelo": model_version,
+                "sentimento_hash": post['sentimento_hash'],
+            })
+
+    progress.start("cosmos", total=len(pending_writes))
+    try:
+        container = cosmos_db.get().get_container_client(COSMOS_CONTAINER)
+        updated, failed = patch_posts(container, pending_writes)
+        invalidate_posts_cache(updated)
+        progress.update("cosmos", len(updated))
+        if failed:
+            warnings.append(f"{len(failed)} posts não foram actualizados no Cosmos.")
+    except Exception as e:
+        logger.error("Erro ao actualizar sentimento no Cosmos: %s", e, exc_info=True)
+        warnings.append(f"Erro ao actualizar sentimento no Cosmos: {e}")
+    progress.finish("cosmos")
 
-    # --- 5️⃣ Guardar sentimento + confiabilidade no Cosmos
+    # --- 6️⃣ Gráfico resumo + WordCloud: desenhados em background, servidos por /charts/<nome>
+    progress.start("charts", total=2)
+    resumo_chart = wc_chart = None
     try:
-        for post in analysed_posts:
-            full_id = post.get('id') or post.get('full_id')
-            if not full_id or "_" not in full_id:
-                continue
+        chart_service = charts.get()
+        resumo_chart = chart_service.summary_chart(counts, avg_confidence, SENTIMENT_LABELS)
+        progress.update("charts", 1)
+        wc_chart = chart_service.wordcloud_chart(merge_frequencies(post_terms))
+    except Exception as e:
+        logger.error("Erro ao gerar gráficos: %s", e, exc_info=True)
+    progress.finish("charts")
 
-            query = f"SELECT * FROM c WHERE c.id = '{full_id}'"
-            items = list(cont_client.query_items(query=query, enable_cross_partition_query=True))
-            if not items:
-                logger.warning(f"❌ Item não encontrado no Cosmos: {full_id}")
-                continue
+    logger.info("[DETAIL_ALL] Tudo concluído com Translator.")
+    resumo = [
+        {"categoria": SENTIMENT_LABELS[c], "posts": int(counts[c]), "confianca_media": round(float(avg_confidence[c]), 1)}
+        for c in np.flatnonzero(counts)
+    ]
+    return {
+        "posts": posts,
+        "resumo": resumo,
+        "resumo_chart": resumo_chart,
+        "wc_chart": wc_chart,
+        "warnings": warnings
+    }
+
+
+def render_analysis(result):
+    for warning in result.get("warnings", []):
+        flash(warning, "danger")
+    # Gráficos desta análise, para o gerar_relatorio enviar os mesmos
+    session["charts"] = {"resumo": result["resumo_chart"], "wordcloud": result["wc_chart"]}
+    session["resumo"] = result.get("resumo")
+    return render_template(
+        "detail_all.html",
+        posts=result["posts"],
+        resumo_chart=result["resumo_chart"],
+        wc_chart=result["wc_chart"]
+    )
 
-            item = items[0]
-            item["sentimento"] = post['sentimento']
-            item["confiabilidade"] = round(post['probabilidade'] / 100, 4)
-            cont_client.replace_item(item=item['id'], body=item)
-            logger.info(f"✅ Sentimento actualizado: {full_id}")
 
+@app.route("/charts/<name>", methods=["GET"])
+def chart(name):
+    """Gráfico pelo nome (hash do conteúdo): espera pelo desenho se ainda estiver em curso."""
+    if not CHART_NAME_RE.fullmatch(name):
+        abort(404)
+    try:
+        chart_service = charts.get()
+        data = chart_service.get_bytes(name, timeout=CHART_WAIT_SECONDS)
     except Exception as e:
-        logger.error("Erro ao actualizar sentimento no Cosmos: %s", e, exc_info=True)
-        flash(f"Erro ao actualizar sentimento no Cosmos: {e}", "danger")
+        logger.error(f"Erro ao obter gráfico {name}: {e}", exc_info=True)
+        data = None
+    if data is None:
+        abort(404)
+    # O nome muda com o conteúdo: a resposta pode ficar em cache no browser indefinidamente
+    response = make_response(data)
+    response.headers["Content-Type"] = chart_service.mimetype
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
 
-    # --- 6️⃣ Gráfico KDE + WordCloud
-    os.makedirs("static", exist_ok=True)
-    resumo_chart = "static/distribuicao_confianca.png"
-    wc_chart = "static/nuvem_palavras_all.png"
+
+@app.route("/detail_all", methods=["POST"])
+def detail_all():
+    # --- 1️⃣ IDs
+    post_ids = collect_post_ids()
+    if not post_ids:
+        flash("Nenhum post disponível para análise.", "warning")
+        return redirect(url_for("home"))
 
     try:
-        # --- Dados para barras
-        categorias = []
-        counts = []
-        avg_probs = []
-
-        if neg_probs:
-            categorias.append("Negative")
-            counts.append(len(neg_probs))
-            avg_probs.append(np.mean(neg_probs))
-        if neu_probs:
-            categorias.append("Neutral")
-            counts.append(len(neu_probs))
-            avg_probs.append(np.mean(neu_probs))
-        if pos_probs:
-            categorias.append("Positive")
-            counts.append(len(pos_probs))
-            avg_probs.append(np.mean(pos_probs))
-
-        if categorias:
-            plt.figure(figsize=(8, 5))
-            bars = plt.bar(categorias, counts, color=['red', 'grey', 'green'][:len(categorias)])
-
-            # Limite superior para texto não colidir
-            plt.ylim(0, max(counts) * 1.3)
-
-            # Anota cada barra
-            for bar, avg_conf in zip(bars, avg_probs):
-                height = bar.get_height()
-                plt.text(
-                    bar.get_x() + bar.get_width() / 2,
-                    height + 0.1,
-                    f"Média Confiança: {avg_conf:.1f}%",
-                    ha='center',
-                    va='bottom',
-                    fontsize=10
-                )
-
-            plt.xlabel("Categoria de Sentimento")
-            plt.ylabel("Número de Posts")
-            plt.title("Número de Posts e Média de Confiança por Categoria")
-            plt.tight_layout()
-            plt.savefig(resumo_chart, dpi=200)
-            plt.close()
-    except Exception as e:
-        logger.error("Erro ao gerar gráfico de barras resumo: %s", e, exc_info=True)
+        result = run_detail_analysis(post_ids, current_search().get("posts_raw", []))
+    except AnalysisError as e:
+        flash(str(e), "danger" if sentiment_engine.error else "warning")
+        return redirect(url_for("home"))
+    return render_analysis(result)
 
 
-    try:
-        wordcloud = WordCloud(width=700, height=350, background_color="white",
-                              stopwords=set(STOPWORDS)).generate(" ".join(text_accum))
-        plt.figure(figsize=(7, 3.5))
-        plt.imshow(wordcloud, interpolation="bilinear")
-        plt.axis("off")
-        plt.tight_layout()
-        plt.savefig(wc_chart, dpi=200)
-        plt.close()
-    except Exception as e:
-        logger.error("Erro ao gerar WordCloud: %s", e, exc_info=True)
+@app.route("/detail_all/jobs", methods=["POST"])
+def detail_all_job_create():
+    """Modo assíncrono: cria (ou reaproveita) um job de análise e devolve o id para acompanhar o progresso."""
+    post_ids = collect_post_ids()
+    if not post_ids:
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify({"error": "Nenhum post disponível para análise."}), 400
+        flash("Nenhum post disponível para análise.", "warning")
+        return redirect(url_for("home"))
 
-    logger.info("[DETAIL_ALL] Tudo concluído com Translator.")
-    return render_template(
-        "detail_all.html",
-        posts=analysed_posts,
-        resumo_chart=resumo_chart,
-        wc_chart=wc_chart
+    job_id = job_manager.submit(
+        job_key(post_ids), run_detail_analysis, post_ids, current_search().get("posts_raw", [])
     )
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({
+            "job_id": job_id,
+            "status_url": url_for("detail_all_job_status", job_id=job_id)
+        }), 202
+    return redirect(url_for("detail_all_job_view", job_id=job_id))
+
+
+@app.route("/detail_all/jobs/<job_id>", methods=["GET"])
+def detail_all_job_status(job_id):
+    """Estado do job: etapas com progresso, resultados parciais e erro, se houver."""
+    job = job_manager.status(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado."}), 404
+    return jsonify({k: v for k, v in job.items() if k != "result"})
+
+
+@app.route("/detail_all/jobs/<job_id>/view", methods=["GET"])
+def detail_all_job_view(job_id):
+    """Página de progresso; quando o job termina, mostra o resultado como o /detail_all síncrono."""
+    job = job_manager.status(job_id)
+    if job is None:
+        flash("Análise não encontrada ou expirada.", "warning")
+        return redirect(url_for("home"))
+    if job["state"] == "done":
+        return render_analysis(job["result"])
+    if job["state"] == "failed":
+        flash(job.get("error") or "A análise falhou.", "danger")
+        return redirect(url_for("home"))
+    return render_template("detail_job.html", job=job)
 
 
 @app.route("/gerar_relatorio", methods=["POST"])
@@ -458,33 +690,39 @@ def gerar_relatorio():
         flash("CONTAINER_ENDPOINT_SAS inválido ou ausente.", "danger")
         return redirect(url_for("home"))
 
-    timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    generated_at = datetime.utcnow()
+    timestamp = generated_at.strftime('%Y%m%d_%H%M%S')
 
     try:
-        # Separar base e token
-        parts = CONTAINER_ENDPOINT_SAS.split('?', 1)
-        if len(parts) != 2:
-            raise ValueError("Formato inválido de CONTAINER_ENDPOINT_SAS")
-        sas_url_base, sas_token = parts
-
-        # Upload apenas dos gráficos
-        candidatos = [
-            ("static/distribuicao_confianca.png", f"distribuicao_confianca_{timestamp}.png"),
-            ("static/nuvem_palavras_all.png", f"nuvem_palavras_all_{timestamp}.png")
-        ]
-        for local_path, target_name in candidatos:
-            if os.path.exists(local_path):
-                chart_url = f"{sas_url_base}/{target_name}?{sas_token}"
-                chart_client = BlobClient.from_blob_url(chart_url)
-                with open(local_path, "rb") as chart_file:
-                    chart_client.upload_blob(chart_file, overwrite=True, content_settings=ContentSettings(
-                        content_type="image/png",
-                        content_disposition="inline"
-                    ))
-        flash("Gráficos enviados com sucesso para o Blob Storage.", "success")
+        # Gráficos da análise desta sessão, em memória (tier de memória da cache de gráficos)
+        chart_service = charts.get()
+        nomes = session.get("charts") or {}
+        graficos = []
+        for key, title in (("resumo", "Número de Posts e Média de Confiança por Categoria"),
+                           ("wordcloud", "Nuvem de Palavras")):
+            data = chart_service.get_bytes(nomes[key], timeout=CHART_WAIT_SECONDS) if nomes.get(key) else None
+            if data:
+                graficos.append((title, data))
+        if not graficos:
+            flash("Não há gráficos de uma análise para publicar.", "warning")
+            return redirect(url_for("home"))
+
+        pdf = build_pdf(graficos, session.get("resumo"), session.get("search_params"), generated_at)
+        pdf_size = pdf.getbuffer().nbytes
+        published = report_publisher.get().publish(
+            [data for _, data in graficos], chart_service.mimetype, chart_service.fmt,
+            dated_name(f"relatorio_{timestamp}.pdf", generated_at), pdf
+        )
+        report_index.get().add({
+            "name": published["pdf"],
+            "created": generated_at.strftime("%Y-%m-%dT%H:%M:%S"),
+            "size": pdf_size,
+            "graficos": published["graficos"],
+        })
+        flash(f"Relatório '{published['pdf']}' e gráficos enviados com sucesso para o Blob Storage.", "success")
     except Exception as e:
-        logger.error("Erro ao enviar gráficos para Azure Blob Storage: %s", e, exc_info=True)
-        flash(f"Erro ao enviar gráficos para Azure Blob Storage: {e}", "danger")
+        logger.error("Erro ao enviar relatório para Azure Blob Storage: %s", e, exc_info=True)
+        flash(f"Erro ao enviar relatório para Azure Blob Storage: {e}", "danger")
 
     return redirect(url_for("home"))
 
@@ -492,25 +730,27 @@ def gerar_relatorio():
 
 @app.route("/listar_ficheiros", methods=["GET"])
 def listar_ficheiros():
+    """
+    Relatórios publicados, mais recentes primeiro, a partir do manifesto (paginado com ?depois=).
+    Com ?prefixo=yyyy/mm/dd lista directamente esse prefixo no Storage, paginado com ?token=.
+    """
     if not CONTAINER_ENDPOINT_SAS:
         flash("CONTAINER_ENDPOINT_SAS inválido ou ausente.", "danger")
         return redirect(url_for("home"))
+    prefixo = request.args.get("prefixo", "").strip()
     try:
-        container_client = ContainerClient.from_container_url(CONTAINER_ENDPOINT_SAS)
-        blobs = list(container_client.list_blobs())
-        # Ordenar por timestamp extraído do nome, se houver padrão
-        def extrai_ts(nome):
-            m = re.search(r'_(\d{8}_\d{6})', nome)
-            return m.group(1) if m else ""
-        ficheiros = sorted(
-            [blob.name for blob in blobs],
-            key=lambda name: extrai_ts(name),
-            reverse=True
-        )
+        index = report_index.get()
+        if prefixo:
+            ficheiros, token = index.list_prefix(prefixo, request.args.get("token") or None)
+            next_url = url_for("listar_ficheiros", prefixo=prefixo, token=token) if token else None
+        else:
+            ficheiros, cursor = index.page(request.args.get("depois") or None)
+            next_url = url_for("listar_ficheiros", depois=cursor) if cursor else None
         sas_parts = CONTAINER_ENDPOINT_SAS.split('?', 1)
         sas_base = sas_parts[0]
         sas_token = sas_parts[1] if len(sas_parts) > 1 else ""
-        return render_template("ficheiros.html", ficheiros=ficheiros, sas_base=sas_base, sas_token=sas_token)
+        return render_template("ficheiros.html", ficheiros=ficheiros, sas_base=sas_base, sas_token=sas_token,
+                               prefixo=prefixo, next_url=next_url)
     except Exception as e:
         logger.error("Erro ao listar ficheiros: %s", e, exc_info=True)
         flash(f"Erro ao listar ficheiros: {e}", "danger")
@@ -528,14 +768,24 @@ def apagar_ficheiro():
         return redirect(url_for("listar_ficheiros"))
 
     try:
-        sas_parts = CONTAINER_ENDPOINT_SAS.split('?', 1)
-        sas_base = sas_parts[0]
-        sas_token = sas_parts[1] if len(sas_parts) > 1 else ""
-
-        blob_url = f"{sas_base}/{ficheiro}?{sas_token}"
-        blob_client = BlobClient.from_blob_url(blob_url)
-
-        blob_client.delete_blob()
+        index = report_index.get()
+        container_client = blob_container.get()
+        entry = index.find(ficheiro)
+        try:
+            container_client.delete_blob(ficheiro)
+        except ResourceNotFoundError:
+            logger.warning(f"Ficheiro '{ficheiro}' já não existia no container.")
+        index.remove(ficheiro)
+
+        # Gráficos partilhados: só são apagados quando nenhum outro relatório os usa
+        if entry and entry.get("graficos"):
+            em_uso = {g for e in index.entries() for g in e.get("graficos", [])}
+            for grafico in entry["graficos"]:
+                if grafico not in em_uso:
+                    try:
+                        container_client.delete_blob(grafico)
+                    except ResourceNotFoundError:
+                        pass
         flash(f"Ficheiro '{ficheiro}' apagado com sucesso.", "success")
     except Exception as e:
         logger.error(f"Erro ao apagar ficheiro '{ficheiro}': {e}", exc_info=True)
@@ -0,0 +1,163 @@
+import os
+import json
+import logging
+import threading
+import time
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+from reports import REPORT_CHARTS_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Índice dos relatórios publicados, num blob do próprio container
+REPORTS_MANIFEST_BLOB = os.getenv("REPORTS_MANIFEST_BLOB", "_index/manifest.json")
+REPORTS_MANIFEST_CACHE_TTL = int(os.getenv("REPORTS_MANIFEST_CACHE_TTL", "30"))
+REPORTS_MANIFEST_MAX_RETRIES = int(os.getenv("REPORTS_MANIFEST_MAX_RETRIES", "5"))
+FICHEIROS_PAGE_SIZE = int(os.getenv("FICHEIROS_PAGE_SIZE", "50"))
+
+# Prefixos que não são relatórios (índice e gráficos partilhados entre relatórios)
+_INTERNAL_PREFIXES = (os.path.dirname(REPORTS_MANIFEST_BLOB) + "/", REPORT_CHARTS_PREFIX)
+
+
+def dated_name(filename: str, when) -> str:
+    """Nome com prefixo yyyy/mm/dd/, para listar um dia (ou mês, ou ano) pelo prefixo."""
+    return f"{when:%Y/%m/%d}/{filename}"
+
+
+def _sort_key(entry: dict):
+    return entry.get("created", ""), entry["name"]
+
+
+def _cursor_of(entry: dict) -> str:
+    return f"{entry.get('created', '')}|{entry['name']}"
+
+
+class ReportIndex:
+    """
+    Manifesto JSON com uma entrada por relatório ({"name", "created", "size", "graficos"}),
+    actualizado no upload e no apagar com concorrência optimista (ETag). A listagem lê o
+    manifesto (em cache no processo durante REPORTS_MANIFEST_CACHE_TTL) em vez de listar o
+    container inteiro; se o manifesto não existir, é reconstruído a partir da listagem paginada.
+    """
+
+    def __init__(self, container_client, manifest_blob: str = REPORTS_MANIFEST_BLOB,
+                 cache_ttl: int = REPORTS_MANIFEST_CACHE_TTL):
+        self.container = container_client
+        self.manifest_blob = manifest_blob
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._cached = None
+        self._cached_at = 0.0
+
+    # --- Leitura
+
+    def entries(self) -> list:
+        with self._lock:
+            if self._cached is not None and time.monotonic() - self._cached_at < self.cache_ttl:
+                return self._cached
+        entries, etag = self._download()
+        if entries is None:
+            entries = self.rebuild(etag)
+        self._set_cache(entries)
+        return entries
+
+    def page(self, cursor: str = None, size: int = FICHEIROS_PAGE_SIZE):
+        """Entradas mais recentes primeiro; `cursor` continua depois da última entrada da página anterior."""
+        entries = self.entries()
+        if cursor:
+            created, _, name = cursor.partition("|")
+            entries = [e for e in entries if _sort_key(e) < (created, name)]
+        page = entries[:size]
+        next_cursor = _cursor_of(page[-1]) if len(entries) > size else None
+        return page, next_cursor
+
+    def find(self, name: str):
+        return next((e for e in self.entries() if e["name"] == name), None)
+
+    def list_prefix(self, prefix: str, continuation_token: str = None, size: int = FICHEIROS_PAGE_SIZE):
+        """Listagem directa do Storage, limitada a um prefixo (ex.: 2024/05/) e paginada pelo serviço."""
+        pager = self.container.list_blobs(name_starts_with=prefix, results_per_page=size)\
+            .by_page(continuation_token=continuation_token)
+        blobs = next(pager, [])
+        entries = [{"name": b.name, "created": _iso(b.last_modified), "size": b.size, "graficos": []}
+                   for b in blobs]
+        return entries, pager.continuation_token
+
+    # --- Escrita
+
+    def add(self, entry: dict):
+        self._update(lambda entries: [e for e in entries if e["name"] != entry["name"]] + [entry])
+
+    def remove(self, name: str):
+        self._update(lambda entries: [e for e in entries if e["name"] != name])
+
+    def rebuild(self, etag=None) -> list:
+        """
+        Reconstrói o manifesto a partir de uma listagem completa (página a página).
+        `etag` é o do manifesto inválido a substituir; sem etag, só cria se não existir.
+        """
+        entries = []
+        for page in self.container.list_blobs().by_page():
+            for blob in page:
+                if not blob.name.startswith(_INTERNAL_PREFIXES):
+                    entries.append({"name": blob.name, "created": _iso(blob.last_modified),
+                                    "size": blob.size, "graficos": []})
+        entries.sort(key=_sort_key, reverse=True)
+        try:
+            self._upload(entries, etag)
+        except Exception as e:
+            # Outro processo criou o manifesto entretanto: fica o dele
+            logger.warning(f"[blob_index] Manifesto reconstruído não gravado: {e}")
+        logger.info(f"[blob_index] Manifesto reconstruído com {len(entries)} entradas")
+        return entries
+
+    def _update(self, change):
+        for attempt in range(REPORTS_MANIFEST_MAX_RETRIES + 1):
+            entries, etag = self._download()
+            if entries is None:
+                self.rebuild(etag)
+                entries, etag = self._download()
+                entries = entries or []
+            updated = sorted(change(entries), key=_sort_key, reverse=True)
+            try:
+                self._upload(updated, etag)
+                self._set_cache(updated)
+                return
+            except (ResourceModifiedError, ResourceExistsError):
+                # Outro pedido alterou o manifesto entre a leitura e a escrita: volta a aplicar
+                if attempt == REPORTS_MANIFEST_MAX_RETRIES:
+                    raise
+                time.sleep(0.05 * (2 ** attempt))
+
+    def _download(self):
+        try:
+            downloader = self.container.download_blob(self.manifest_blob)
+            data = json.loads(downloader.readall())
+            return data.get("entries", []), downloader.properties.etag
+        except ResourceNotFoundError:
+            return None, None
+        except ValueError as e:
+            logger.error(f"[blob_index] Manifesto inválido, a reconstruir: {e}")
+            return None, downloader.properties.etag
+
+    def _upload(self, entries: list, etag):
+        body = json.dumps({"version": 1, "entries": entries}, ensure_ascii=False).encode("utf-8")
+        settings = ContentSettings(content_type="application/json")
+        if etag:
+            self.container.upload_blob(self.manifest_blob, body, overwrite=True, content_settings=settings,
+                                       etag=etag, match_condition=MatchConditions.IfNotModified)
+        else:
+            # Só cria se ainda não existir (ResourceExistsError caso contrário)
+            self.container.upload_blob(self.manifest_blob, body, overwrite=False, content_settings=settings)
+
+    def _set_cache(self, entries: list):
+        with self._lock:
+            self._cached = entries
+            self._cached_at = time.monotonic()
+
+
+def _iso(value) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S") if value else ""
@@ -0,0 +1,244 @@
+import os
+import io
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Cache de gráficos em disco, endereçada pelo conteúdo (hash dos agregados de entrada)
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "cache/charts")
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png").lower()  # "png" ou "webp"
+CHART_DPI = int(os.getenv("CHART_DPI", "200"))
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+# Tier em memória com os gráficos mais recentes: o relatório usa os bytes sem voltar ao disco
+CHART_MEMORY_MAX_BYTES = int(os.getenv("CHART_MEMORY_MAX_BYTES", str(32 * 1024 * 1024)))
+# Especificações guardadas para voltar a desenhar um gráfico que saiu da cache do disco
+CHART_SPECS_MAX = int(os.getenv("CHART_SPECS_MAX", "256"))
+
+MIMETYPES = {"png": "image/png", "webp": "image/webp"}
+# Sobe quando o desenho muda, para não servir imagens antigas da cache
+RENDER_VERSION = 2
+
+
+class ChartService:
+    """
+    Desenha os gráficos da análise num pool de threads, com a API orientada a objectos do Agg
+    (sem o estado global do pyplot, por isso vários gráficos podem ser desenhados em paralelo).
+    O nome de cada gráfico é o hash dos dados de entrada: análises iguais reaproveitam a imagem
+    e análises diferentes nunca partilham ficheiros. A cache em disco é LRU pelo tamanho total.
+    """
+
+    def __init__(self, cache_dir: str = CHART_CACHE_DIR, max_bytes: int = CHART_CACHE_MAX_BYTES,
+                 fmt: str = CHART_FORMAT, dpi: int = CHART_DPI, workers: int = CHART_RENDER_WORKERS):
+        if fmt not in MIMETYPES:
+            raise ValueError(f"CHART_FORMAT inválido: {fmt} (esperado png ou webp)")
+        # Importa já as bibliotecas de desenho (o warm-up do arranque paga este custo)
+        from matplotlib.figure import Figure  # noqa: F401
+        from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: F401
+        from wordcloud import WordCloud  # noqa: F401
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.dpi = dpi
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="chart-render")
+        self._inflight = {}
+        self._specs = OrderedDict()
+        self._index = OrderedDict()  # nome -> bytes, do menos para o mais recentemente usado
+        self._total = 0
+        self._memory = OrderedDict()  # nome -> conteúdo
+        self._memory_total = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @property
+    def mimetype(self) -> str:
+        return MIMETYPES[self.fmt]
+
+    # --- API usada pela análise
+
+    def summary_chart(self, counts, avg_confidence, labels) -> str:
+        """Barras com o número de posts e a confiança média (%) de cada categoria presente."""
+        data = [(str(label), int(count), round(float(avg), 1))
+                for label, count, avg in zip(labels, counts, avg_confidence) if count]
+        return self._submit("summary", data) if data else None
+
+    def wordcloud_chart(self, frequencies: dict) -> str:
+        """Nuvem a partir das frequências já agregadas ({termo: contagem}, vocabulário limitado)."""
+        return self._submit("wordcloud", sorted(frequencies.items())) if frequencies else None
+
+    def get_bytes(self, name: str, timeout: float = None):
+        """Bytes do gráfico: da cache, do desenho em curso ou redesenhado a partir da especificação."""
+        data = self._wait_and_read(name, timeout)
+        if data is None:
+            with self._lock:
+                spec = self._specs.get(name)
+            if spec is not None:
+                # Saiu da cache do disco: volta a desenhar no pool
+                self._submit(*spec)
+                data = self._wait_and_read(name, timeout)
+        return data
+
+    # --- Interno
+
+    def _name(self, kind: str, payload) -> str:
+        raw = json.dumps([RENDER_VERSION, kind, self.fmt, self.dpi, payload], ensure_ascii=False)
+        return f"{hashlib.sha256(raw.encode('utf-8')).hexdigest()}.{self.fmt}"
+
+    def _submit(self, kind: str, payload) -> str:
+        name = self._name(kind, payload)
+        with self._lock:
+            self._specs[name] = (kind, payload)
+            self._specs.move_to_end(name)
+            while len(self._specs) > CHART_SPECS_MAX:
+                self._specs.popitem(last=False)
+            if name in self._index or name in self._inflight:
+                return name
+            future = self._pool.submit(self._render_to_cache, name, kind, payload)
+            self._inflight[name] = future
+        future.add_done_callback(lambda _: self._done(name))
+        return name
+
+    def _wait_and_read(self, name: str, timeout: float = None):
+        with self._lock:
+            future = self._inflight.get(name)
+        if future is not None:
+            data = future.result(timeout=timeout)
+            if data is not None:
+                return data
+        return self._read(name)
+
+    def _done(self, name: str):
+        with self._lock:
+            self._inflight.pop(name, None)
+
+    def _render_to_cache(self, name: str, kind: str, payload):
+        try:
+            data = self._render_summary(payload) if kind == "summary" else self._render_wordcloud(payload)
+        except Exception as e:
+            logger.error(f"[charts] Erro ao desenhar '{kind}': {e}", exc_info=True)
+            return None
+        self._remember(name, data)
+        self._write(name, data)
+        return data
+
+    def _render_summary(self, data) -> bytes:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        colors = {"Negative": "red", "Neutral": "grey", "Positive": "green"}
+        labels = [label for label, _, _ in data]
+        counts = [count for _, count, _ in data]
+
+        fig = Figure(figsize=(8, 5))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        bars = ax.bar(labels, counts, color=[colors.get(label, "grey") for label in labels])
+
+        # Limite superior para texto não colidir
+        ax.set_ylim(0, max(counts) * 1.3)
+
+        # Anota cada barra
+        for bar, (_, _, avg_conf) in zip(bars, data):
+            ax.text(
+                bar.get_x() + bar.get_width() / 2,
+                bar.get_height() + 0.1,
+                f"Média Confiança: {avg_conf:.1f}%",
+                ha='center',
+                va='bottom',
+                fontsize=10
+            )
+
+        ax.set_xlabel("Categoria de Sentimento")
+        ax.set_ylabel("Número de Posts")
+        ax.set_title("Número de Posts e Média de Confiança por Categoria")
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=self.fmt, dpi=self.dpi)
+        return buffer.getvalue()
+
+    def _render_wordcloud(self, frequencies) -> bytes:
+        from wordcloud import WordCloud
+
+        # A imagem sai directamente do WordCloud, à resolução que o imshow + savefig dava
+        wordcloud = WordCloud(width=700, height=350, background_color="white", scale=self.dpi / 100,
+                              max_words=len(frequencies)).generate_from_frequencies(dict(frequencies))
+        buffer = io.BytesIO()
+        wordcloud.to_image().save(buffer, format=self.fmt.upper())
+        return buffer.getvalue()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _load_index(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(f".{self.fmt}"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total += size
+
+    def _remember(self, name: str, data: bytes):
+        with self._lock:
+            if name in self._memory:
+                self._memory.move_to_end(name)
+                return
+            self._memory[name] = data
+            self._memory_total += len(data)
+            while self._memory_total > CHART_MEMORY_MAX_BYTES and len(self._memory) > 1:
+                _, old = self._memory.popitem(last=False)
+                self._memory_total -= len(old)
+
+    def _read(self, name: str):
+        with self._lock:
+            data = self._memory.get(name)
+            if data is not None:
+                self._memory.move_to_end(name)
+                return data
+        try:
+            with open(self._path(name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._index.pop(name, 0)
+            return None
+        with self._lock:
+            if name in self._index:
+                self._index.move_to_end(name)
+        try:
+            # mtime como último acesso: a ordem LRU sobrevive a reinícios
+            os.utime(self._path(name))
+        except OSError:
+            pass
+        self._remember(name, data)
+        return data
+
+    def _write(self, name: str, data: bytes):
+        # Escrita atómica: outros processos nunca vêem um ficheiro a meio
+        tmp_path = f"{self._path(name)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(name))
+        with self._lock:
+            self._total += len(data) - self._index.pop(name, 0)
+            self._index[name] = len(data)
+            evicted = []
+            while self._total > self.max_bytes and len(self._index) > 1:
+                old_name, size = self._index.popitem(last=False)
+                self._total -= size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(self._path(old_name))
+            except FileNotFoundError:
+                pass
+        if evicted:
+            logger.info(f"[charts] {len(evicted)} gráficos removidos da cache (LRU)")
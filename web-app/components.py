@@ -0,0 +1,72 @@
+import os
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Depois de uma falha, o componente só volta a tentar carregar passado este intervalo
+COMPONENT_RETRY_SECONDS = int(os.getenv("COMPONENT_RETRY_SECONDS", "60"))
+
+
+class LazyComponent:
+    """
+    Componente pesado (modelo, ligação ao Cosmos, bibliotecas de gráficos) construído só no
+    primeiro uso, uma única vez mesmo com vários threads a pedi-lo ao mesmo tempo.
+    """
+
+    def __init__(self, name: str, factory, clock=time.monotonic):
+        self.name = name
+        self._factory = factory
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self.error = None
+        self.failed_at = None
+        self.load_seconds = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if self._loaded:
+                return self._value
+            if self.error is not None and self._clock() - self.failed_at < COMPONENT_RETRY_SECONDS:
+                raise RuntimeError(f"Componente '{self.name}' indisponível: {self.error}")
+
+            started = time.perf_counter()
+            try:
+                value = self._factory()
+            except Exception as e:
+                self.error = str(e)
+                self.failed_at = self._clock()
+                logger.error(f"[startup] Falha ao carregar '{self.name}': {e}", exc_info=True)
+                raise
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            self._value, self._loaded, self.error = value, True, None
+            logger.info(f"[startup] '{self.name}' carregado em {self.load_seconds:.2f}s")
+            return value
+
+    def status(self) -> dict:
+        return {"loaded": self._loaded, "load_seconds": self.load_seconds, "error": self.error}
+
+
+def load_all(components):
+    """Carrega os componentes por ordem; uma falha não impede os seguintes."""
+    for component in components:
+        try:
+            component.get()
+        except Exception:
+            pass
+
+
+def start_warmup(components) -> threading.Thread:
+    """Warm-up em background: o processo aceita pedidos enquanto os componentes carregam."""
+    thread = threading.Thread(target=load_all, args=(list(components),), name="startup-warmup", daemon=True)
+    thread.start()
+    return thread
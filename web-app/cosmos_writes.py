@@ -0,0 +1,121 @@
+"""
+Escrita em lote dos resultados da análise no Cosmos (patch parcial por post).
+
+partition_key_of e _with_throttle_retry são cópias dos de redditIngestFunc (shared_code/cosmos_batch.py
+e GetPostsFunction), e _chunk_patches segue o _chunk_operations de cosmos_batch.py: o web-app e a
+Function App são implantados em separado e não partilham código.
+"""
+import os
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+logger = logging.getLogger(__name__)
+
+# Uma transactional batch aceita até 100 operações, todas da mesma partição, e até 2 MB
+BATCH_MAX_OPERATIONS = 100
+BATCH_MAX_BYTES = 1_800_000  # folga para o envelope do pedido
+COSMOS_WRITE_CONCURRENCY = int(os.getenv("COSMOS_WRITE_CONCURRENCY", "8"))
+COSMOS_MAX_THROTTLE_RETRIES = int(os.getenv("COSMOS_MAX_THROTTLE_RETRIES", "5"))
+
+
+def partition_key_of(item_id: str):
+    """O id tem o formato <subreddit>_<id reddit>; a partition key é o subreddit."""
+    if not item_id or "_" not in item_id:
+        return None
+    return item_id.split("_", 1)[0].strip()
+
+
+def patch_posts(container, updates: dict):
+    """
+    Grava campos de vários posts com um único patch parcial por post (sem ler nem substituir o
+    documento). `updates` é {id: {campo: valor}}. Os patches de cada partição seguem em
+    transactional batches e as partições são processadas em paralelo; se uma batch falhar,
+    os seus patches são repetidos um a um.
+    Devolve (ids actualizados, [{"id": ..., "error": ...}]).
+    """
+    failed = []
+    partitioned = {}
+    for item_id, fields in updates.items():
+        pk = partition_key_of(item_id)
+        if not pk:
+            failed.append({"id": item_id, "error": "ID inválido: esperado <subreddit>_<id>."})
+            continue
+        patch_ops = [{"op": "set", "path": f"/{field}", "value": value} for field, value in fields.items()]
+        partitioned.setdefault(pk, []).append((item_id, patch_ops))
+
+    success = []
+    if not partitioned:
+        return success, failed
+
+    workers = min(COSMOS_WRITE_CONCURRENCY, len(partitioned))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for part_success, part_failed in pool.map(lambda entry: _patch_partition(container, *entry),
+                                                  partitioned.items()):
+            success.extend(part_success)
+            failed.extend(part_failed)
+
+    logger.info(f"✅ {len(success)} posts actualizados no Cosmos em {len(partitioned)} partições "
+                f"({len(failed)} falhados)")
+    return success, failed
+
+
+def _patch_partition(container, partition_key, patches):
+    success, failed = [], []
+    for chunk in _chunk_patches(patches):
+        try:
+            _with_throttle_retry(lambda: container.execute_item_batch(
+                batch_operations=[("patch", (item_id, ops)) for item_id, ops in chunk],
+                partition_key=partition_key
+            ))
+            success.extend(item_id for item_id, _ in chunk)
+            continue
+        except Exception as e:
+            # Falha do serviço (CosmosBatchOperationError/CosmosHttpResponseError) ou de rede
+            logger.warning(f"Batch de {len(chunk)} patches falhou na partição '{partition_key}' "
+                           f"({e}); a repetir post a post.")
+
+        for item_id, ops in chunk:
+            try:
+                _with_throttle_retry(lambda: container.patch_item(
+                    item=item_id, partition_key=partition_key, patch_operations=ops
+                ))
+                success.append(item_id)
+            except Exception as e:
+                # Inclui erros de rede (ex.: ServiceRequestError): os restantes posts continuam
+                error = "Item não encontrado no Cosmos." if getattr(e, "status_code", None) == 404 else str(e)
+                logger.warning(f"❌ Falha ao actualizar {item_id}: {error}")
+                failed.append({"id": item_id, "error": error})
+    return success, failed
+
+
+def _chunk_patches(patches):
+    """Divide os patches em batches limitadas pelo número de operações e pelo tamanho serializado."""
+    chunk, chunk_bytes = [], 0
+    for item_id, ops in patches:
+        op_bytes = len(json.dumps(ops, ensure_ascii=False, default=str).encode("utf-8"))
+        if chunk and (len(chunk) >= BATCH_MAX_OPERATIONS or chunk_bytes + op_bytes > BATCH_MAX_BYTES):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append((item_id, ops))
+        chunk_bytes += op_bytes
+    if chunk:
+        yield chunk
+
+
+def _with_throttle_retry(call):
+    """Repete a chamada quando o Cosmos responde 429, respeitando o x-ms-retry-after-ms."""
+    for attempt in range(COSMOS_MAX_THROTTLE_RETRIES + 1):
+        try:
+            return call()
+        except CosmosHttpResponseError as e:
+            if e.status_code != 429 or attempt == COSMOS_MAX_THROTTLE_RETRIES:
+                raise
+            headers = getattr(e, "headers", None) or {}
+            retry_after_ms = headers.get("x-ms-retry-after-ms")
+            delay = float(retry_after_ms) / 1000 if retry_after_ms else 0.1 * (2 ** attempt)
+            logger.warning(f"Cosmos 429 (RU throttling); nova tentativa em {delay:.2f}s.")
+            time.sleep(delay)
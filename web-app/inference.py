@@ -0,0 +1,229 @@
+import os
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Modelo de sentimento fixado por revisão: o id fica guardado com cada resultado no Cosmos
+# e os posts só voltam a ser classificados quando o modelo ou o texto mudam
+SENTIMENT_MODEL = os.getenv("SENTIMENT_MODEL", "distilbert/distilbert-base-uncased-finetuned-sst-2-english")
+SENTIMENT_MODEL_REVISION = os.getenv("SENTIMENT_MODEL_REVISION", "714eb0f")
+
+# Motor de inferência: "pytorch", "onnx" (ONNX Runtime via optimum) ou "quantized" (int8 dinâmico)
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "pytorch").lower()
+SENTIMENT_THREADS = int(os.getenv("SENTIMENT_THREADS", str(os.cpu_count() or 1)))
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "32"))
+SENTIMENT_MAX_TOKENS = int(os.getenv("SENTIMENT_MAX_TOKENS", "512"))
+SENTIMENT_WARMUP = os.getenv("SENTIMENT_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# "binary": classe com maior probabilidade. "three_class": Neutral vem do próprio modelo (se tiver
+# essa classe) ou, num modelo binário, da banda |p(pos) - p(neg)| < SENTIMENT_NEUTRAL_BAND
+SENTIMENT_MODE = os.getenv("SENTIMENT_MODE", "binary").lower()
+SENTIMENT_NEUTRAL_BAND = float(os.getenv("SENTIMENT_NEUTRAL_BAND", "0.2"))
+
+BACKENDS = ("pytorch", "onnx", "quantized")
+MODES = ("binary", "three_class")
+
+# Colunas da distribuição devolvida por predict_distribution
+SENTIMENT_LABELS = ("Negative", "Neutral", "Positive")
+NEGATIVE, NEUTRAL, POSITIVE = range(3)
+
+
+def model_id(model_name: str = SENTIMENT_MODEL, revision: str = SENTIMENT_MODEL_REVISION,
+             backend: str = SENTIMENT_BACKEND, mode: str = SENTIMENT_MODE,
+             neutral_band: float = SENTIMENT_NEUTRAL_BAND) -> str:
+    """
+    Id guardado com cada resultado: modelo e revisão carregados, mais o backend, porque o modelo
+    quantizado não dá exactamente os mesmos scores que o original, e o modo/banda, que mudam a categoria.
+    """
+    model = f"{model_name}@{revision}"
+    if backend != "pytorch":
+        model += f"+{backend}"
+    if mode == "three_class":
+        model += f"+3c{neutral_band:g}"
+    return model
+
+
+def _label_column(label: str, index: int, n_labels: int) -> int:
+    """Coluna (NEGATIVE/NEUTRAL/POSITIVE) de uma classe do modelo, pelo nome ou pela posição."""
+    name = str(label).lower()
+    for prefix, column in (("neg", NEGATIVE), ("neu", NEUTRAL), ("pos", POSITIVE)):
+        if name.startswith(prefix):
+            return column
+    # Nomes genéricos (LABEL_0, ...): ordem negativo, [neutro,] positivo
+    if n_labels == 2:
+        return (NEGATIVE, POSITIVE)[index]
+    if n_labels == 3:
+        return index
+    raise ValueError(f"Classe '{label}' do modelo não mapeável para Negative/Neutral/Positive")
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def classify(dist: np.ndarray, mode: str, neutral_band: float, has_neutral: bool):
+    """
+    Categoria e confiança de cada linha da distribuição, vectorizado. Com banda neutra num
+    modelo binário, a confiança de um Neutral é 1 - |p(pos) - p(neg)|.
+    Devolve (classes, confiança) como arrays.
+    """
+    classes = dist.argmax(axis=1)
+    confidence = dist[np.arange(len(dist)), classes]
+    if mode == "three_class" and not has_neutral and len(dist):
+        margin = np.abs(dist[:, POSITIVE] - dist[:, NEGATIVE])
+        neutral = margin < neutral_band
+        classes = np.where(neutral, NEUTRAL, classes)
+        confidence = np.where(neutral, 1.0 - margin, confidence)
+    elif mode == "binary" and has_neutral:
+        # Modelo de 3 classes em modo binário: escolhe entre negativo e positivo
+        classes = np.where(dist[:, POSITIVE] >= dist[:, NEGATIVE], POSITIVE, NEGATIVE)
+        confidence = dist[np.arange(len(dist)), classes] / (dist[:, POSITIVE] + dist[:, NEGATIVE])
+    return classes, confidence
+
+
+class SentimentEngine:
+    """
+    Classificador de sentimento com backend configurável. Tokeniza todos os textos de uma vez,
+    ordena-os pelo número de tokens e monta as batches por comprimento, para o padding de cada
+    batch ser mínimo. Devolve [{"label", "score"}] pela ordem de entrada, como o pipeline.
+    """
+
+    def __init__(self, model: str = SENTIMENT_MODEL, revision: str = SENTIMENT_MODEL_REVISION,
+                 backend: str = SENTIMENT_BACKEND, threads: int = SENTIMENT_THREADS,
+                 batch_size: int = SENTIMENT_BATCH_SIZE, max_tokens: int = SENTIMENT_MAX_TOKENS,
+                 mode: str = SENTIMENT_MODE, neutral_band: float = SENTIMENT_NEUTRAL_BAND):
+        if backend not in BACKENDS:
+            raise ValueError(f"SENTIMENT_BACKEND inválido: {backend} (esperado um de {', '.join(BACKENDS)})")
+        if mode not in MODES:
+            raise ValueError(f"SENTIMENT_MODE inválido: {mode} (esperado um de {', '.join(MODES)})")
+        self.model_name = model
+        self.revision = revision
+        self.backend = backend
+        self.threads = max(1, threads)
+        self.batch_size = max(1, batch_size)
+        self.max_tokens = max_tokens
+        self.mode = mode
+        self.neutral_band = neutral_band
+        self.tokenizer = None
+        self.model = None
+        self.id2label = {}
+        self.columns = None
+        self.has_neutral = False
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        return model_id(self.model_name, self.revision, self.backend, self.mode, self.neutral_band)
+
+    def load(self):
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        started = time.perf_counter()
+        torch.set_num_threads(self.threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, revision=self.revision)
+
+        if self.backend == "onnx":
+            self.model = self._load_onnx()
+        else:
+            model = AutoModelForSequenceClassification.from_pretrained(self.model_name, revision=self.revision)
+            model.eval()
+            if self.backend == "quantized":
+                # Quantização dinâmica das camadas lineares: pesos em int8, activações em float
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.model = model
+
+        self.id2label = {int(k): v for k, v in self.model.config.id2label.items()}
+        n_labels = len(self.id2label)
+        self.columns = np.array([_label_column(self.id2label[i], i, n_labels) for i in range(n_labels)])
+        self.has_neutral = bool((self.columns == NEUTRAL).any())
+        logger.info(f"[inference] Modelo {self.model_id} carregado em {time.perf_counter() - started:.1f}s "
+                    f"({self.threads} threads, batches de {self.batch_size})")
+        return self
+
+    def _load_onnx(self):
+        try:
+            import onnxruntime as ort
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError as e:
+            raise RuntimeError("SENTIMENT_BACKEND=onnx requer os pacotes optimum[onnxruntime]") from e
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # export=True converte o checkpoint PyTorch para ONNX no primeiro carregamento
+        return ORTModelForSequenceClassification.from_pretrained(
+            self.model_name, revision=self.revision, export=True, session_options=options
+        )
+
+    def warmup(self):
+        """Uma passagem com textos curtos e longos, para alocar os buffers antes do primeiro pedido."""
+        started = time.perf_counter()
+        self.predict(["warm up"] * self.batch_size + ["warm up " * (self.max_tokens // 2)])
+        logger.info(f"[inference] Warm-up concluído em {time.perf_counter() - started:.2f}s")
+
+    def _logits(self, batch) -> np.ndarray:
+        import torch
+
+        features = self.tokenizer.pad(batch, padding=True, return_tensors="pt")
+        with torch.inference_mode():
+            logits = self.model(**features).logits
+        return logits.detach().cpu().numpy() if hasattr(logits, "detach") else np.asarray(logits)
+
+    def predict_proba(self, texts) -> np.ndarray:
+        """Matriz (len(texts), n_classes) com a softmax de cada texto, pela ordem de entrada."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, len(self.id2label)))
+
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_tokens)
+        keys = list(encoded.keys())
+        lengths = np.array([len(ids) for ids in encoded["input_ids"]])
+        order = np.argsort(lengths, kind="stable")
+
+        probs = np.zeros((len(texts), len(self.id2label)), dtype=np.float32)
+        with self._lock:
+            for start in range(0, len(order), self.batch_size):
+                chunk = order[start:start + self.batch_size]
+                batch = [{k: encoded[k][i] for k in keys} for i in chunk]
+                probs[chunk] = _softmax(self._logits(batch))
+        return probs
+
+    def predict_distribution(self, texts) -> np.ndarray:
+        """
+        Matriz (len(texts), 3) com p(Negative), p(Neutral), p(Positive) de cada texto (softmax
+        completa, top_k=None). Num modelo binário a coluna Neutral fica a zero.
+        """
+        probs = self.predict_proba(texts)
+        dist = np.zeros((len(probs), len(SENTIMENT_LABELS)), dtype=np.float32)
+        np.add.at(dist.T, self.columns, probs.T)
+        return dist
+
+    def classify(self, dist: np.ndarray):
+        return classify(dist, self.mode, self.neutral_band, self.has_neutral)
+
+    def info(self) -> dict:
+        """Configuração necessária para classificar, fora do processo, as distribuições deste motor."""
+        return {"model_id": self.model_id, "mode": self.mode, "neutral_band": self.neutral_band,
+                "has_neutral": self.has_neutral, "batch_size": self.batch_size}
+
+    def predict(self, texts) -> list:
+        classes, confidence = self.classify(self.predict_distribution(texts))
+        return [{"label": SENTIMENT_LABELS[c], "score": float(p)} for c, p in zip(classes, confidence)]
+
+    def __call__(self, texts, **kwargs) -> list:
+        return self.predict(texts)
+
+
+def load_engine() -> SentimentEngine:
+    engine = SentimentEngine().load()
+    if SENTIMENT_WARMUP:
+        engine.warmup()
+    return engine
@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def job_key(post_ids) -> str:
+    """Chave do resultado: hash do conjunto de ids (sem depender da ordem nem de repetidos)."""
+    joined = "\n".join(sorted(set(post_ids)))
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+
+class JobBackend:
+    """
+    Interface do backend de jobs: onde o estado é guardado e como os jobs são executados.
+    Um backend partilhado (ex.: Redis + workers dedicados) implementa os mesmos métodos; os
+    jobs guardados têm de ser serializáveis em JSON.
+    """
+
+    def save(self, job: dict):
+        raise NotImplementedError
+
+    def load(self, job_id: str):
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields):
+        raise NotImplementedError
+
+    def update_stage(self, job_id: str, stage: str, **fields):
+        job = self.load(job_id)
+        if job is not None:
+            stages = job["stages"]
+            stages.setdefault(stage, {}).update(fields)
+            self.update(job_id, stages=stages)
+
+    def find_by_key(self, key: str):
+        """Job mais recente (não falhado e não expirado) para a chave dada, ou None."""
+        raise NotImplementedError
+
+    def enqueue(self, job_id: str, task):
+        raise NotImplementedError
+
+
+class InProcessJobBackend(JobBackend):
+    """Backend por omissão: estado em memória e fila em processo servida por um pool de threads."""
+
+    def __init__(self, max_workers: int, ttl: int, clock=time.time):
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_key = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+
+    def save(self, job: dict):
+        with self._lock:
+            self._evict_expired()
+            self._jobs[job["id"]] = job
+            self._by_key[job["key"]] = job["id"]
+
+    def load(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or self._expired(job):
+                return None
+            return _snapshot(job)
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                job["updated_at"] = self._clock()
+
+    def update_stage(self, job_id: str, stage: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["stages"].setdefault(stage, {}).update(fields)
+                job["updated_at"] = self._clock()
+
+    def find_by_key(self, key: str):
+        with self._lock:
+            job = self._jobs.get(self._by_key.get(key))
+            if job is None or job["state"] == "failed" or self._expired(job):
+                return None
+            return _snapshot(job)
+
+    def enqueue(self, job_id: str, task):
+        self._pool.submit(task)
+
+    def _expired(self, job) -> bool:
+        return job["state"] in ("done", "failed") and self._clock() - job["updated_at"] > self._ttl
+
+    def _evict_expired(self):
+        # Chamado com o lock adquirido
+        for job_id in [j for j, job in self._jobs.items() if self._expired(job)]:
+            job = self._jobs.pop(job_id)
+            if self._by_key.get(job["key"]) == job_id:
+                del self._by_key[job["key"]]
+
+
+def _snapshot(job: dict) -> dict:
+    """Cópia para devolver fora do lock (as etapas continuam a ser actualizadas pelo worker)."""
+    return {**job, "stages": {name: dict(stage) for name, stage in job["stages"].items()},
+            "partial": dict(job["partial"])}
+
+
+class JobProgress:
+    """Entregue à função do job para reportar o progresso de cada etapa e resultados parciais."""
+
+    def __init__(self, backend: JobBackend, job_id: str):
+        self._backend = backend
+        self._job_id = job_id
+
+    def start(self, stage: str, total=None):
+        self._update_stage(stage, state="running", done=0, total=total)
+
+    def update(self, stage: str, done: int):
+        self._update_stage(stage, done=done)
+
+    def finish(self, stage: str, done=None):
+        fields = {"state": "done"}
+        if done is not None:
+            fields["done"] = done
+        self._update_stage(stage, **fields)
+
+    def partial(self, key: str, value):
+        job = self._backend.load(self._job_id)
+        if job is not None:
+            self._backend.update(self._job_id, partial={**job["partial"], key: value})
+
+    def _update_stage(self, stage: str, **fields):
+        self._backend.update_stage(self._job_id, stage, **fields)
+
+
+class NullProgress:
+    """Progresso que não reporta nada (execução síncrona)."""
+
+    def start(self, stage: str, total=None):
+        pass
+
+    def update(self, stage: str, done: int):
+        pass
+
+    def finish(self, stage: str, done=None):
+        pass
+
+    def partial(self, key: str, value):
+        pass
+
+
+class JobManager:
+    """
+    Cria jobs de análise e corre-os em background. Um resultado terminado fica em cache pela
+    chave (hash do conjunto de ids) durante `result_ttl`, e um pedido repetido reutiliza o
+    mesmo job em vez de voltar a correr o pipeline.
+    """
+
+    def __init__(self, backend: JobBackend = None, max_workers: int = 2, result_ttl: int = 3600):
+        self.backend = backend or InProcessJobBackend(max_workers=max_workers, ttl=result_ttl)
+
+    def submit(self, key: str, fn, *args) -> str:
+        existing = self.backend.find_by_key(key)
+        if existing is not None:
+            logger.info(f"[jobs] A reutilizar job {existing['id']} ({existing['state']}) para a chave {key[:12]}")
+            return existing["id"]
+
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self.backend.save({
+            "id": job_id,
+            "key": key,
+            "state": "queued",
+            "stages": {},
+            "partial": {},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        })
+        self.backend.enqueue(job_id, lambda: self._run(job_id, fn, args))
+        logger.info(f"[jobs] Job {job_id} em fila para a chave {key[:12]}")
+        return job_id
+
+    def status(self, job_id: str):
+        return self.backend.load(job_id)
+
+    def _run(self, job_id: str, fn, args):
+        self.backend.update(job_id, state="running")
+        try:
+            result = fn(*args, progress=JobProgress(self.backend, job_id))
+        except Exception as e:
+            logger.error(f"[jobs] Job {job_id} falhou: {e}", exc_info=True)
+            self.backend.update(job_id, state="failed", error=str(e))
+            return
+        self.backend.update(job_id, state="done", result=result, partial={})
+        logger.info(f"[jobs] Job {job_id} concluído")
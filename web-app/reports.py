@@ -0,0 +1,109 @@
+import os
+import io
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob import ContentSettings
+
+logger = logging.getLogger(__name__)
+
+REPORT_UPLOAD_CONCURRENCY = int(os.getenv("REPORT_UPLOAD_CONCURRENCY", "4"))
+# Os gráficos ficam num prefixo endereçado pelo conteúdo: o mesmo gráfico só é enviado uma vez
+REPORT_CHARTS_PREFIX = os.getenv("REPORT_CHARTS_PREFIX", "graficos/")
+
+
+def content_name(data: bytes, ext: str) -> str:
+    return f"{REPORT_CHARTS_PREFIX}{hashlib.sha256(data).hexdigest()}.{ext}"
+
+
+def build_pdf(charts, resumo, search_params, generated_at: datetime) -> io.BytesIO:
+    """
+    Relatório PDF em memória: parâmetros da pesquisa, tabela por categoria e os gráficos.
+    `charts` é uma lista de (título, bytes da imagem); devolve o buffer já posicionado no início.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    story = [
+        Paragraph("Relatório de Análise de Sentimento", styles["Title"]),
+        Paragraph(f"Gerado em {generated_at.strftime('%Y-%m-%d %H:%M:%S')} UTC", styles["Normal"]),
+    ]
+    if search_params:
+        story.append(Paragraph(
+            f"Subreddit: {search_params.get('subreddit', '')} · ordenação: {search_params.get('sort', '')} "
+            f"· limite: {search_params.get('limit', '')}", styles["Normal"]))
+    story.append(Spacer(1, 0.5 * cm))
+
+    if resumo:
+        rows = [["Categoria", "Número de Posts", "Média Confiança"]]
+        rows += [[r["categoria"], str(r["posts"]), f"{r['confianca_media']:.1f}%"] for r in resumo]
+        table = Table(rows, hAlign="LEFT")
+        table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ]))
+        story += [table, Spacer(1, 0.5 * cm)]
+
+    width = A4[0] - 4 * cm
+    for title, data in charts:
+        image = Image(io.BytesIO(data))
+        image.drawHeight = width * image.imageHeight / image.imageWidth
+        image.drawWidth = width
+        story += [Paragraph(title, styles["Heading2"]), image, Spacer(1, 0.5 * cm)]
+
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, leftMargin=2 * cm, rightMargin=2 * cm,
+                      title="Relatório de Análise de Sentimento").build(story)
+    buffer.seek(0)
+    return buffer
+
+
+class ReportPublisher:
+    """
+    Publica um relatório num só passo de I/O paralelo sobre um ContainerClient partilhado:
+    os gráficos (bytes em memória, nome pelo hash do conteúdo, enviados só se ainda não
+    existirem) e o PDF, enviado a partir do buffer como stream.
+    """
+
+    def __init__(self, container_client, workers: int = REPORT_UPLOAD_CONCURRENCY):
+        self.container = container_client
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="report-upload")
+
+    def publish(self, charts, mimetype: str, ext: str, pdf_name: str, pdf: io.BytesIO) -> dict:
+        """
+        `charts` é uma lista de bytes. Devolve {"pdf": nome, "graficos": [nomes],
+        "novos": [nomes enviados agora]}; falhas de upload são propagadas.
+        """
+        chart_names = list(dict.fromkeys(content_name(data, ext) for data in charts))
+        by_name = {content_name(data, ext): data for data in charts}
+
+        def upload_chart(name):
+            try:
+                # overwrite=False: se o mesmo conteúdo já foi publicado, o serviço recusa e não há reenvio
+                self.container.upload_blob(name, by_name[name], overwrite=False,
+                                           content_settings=ContentSettings(content_type=mimetype,
+                                                                            content_disposition="inline"))
+                return name
+            except ResourceExistsError:
+                return None
+
+        def upload_pdf():
+            self.container.upload_blob(pdf_name, pdf, length=pdf.getbuffer().nbytes, overwrite=True,
+                                       content_settings=ContentSettings(content_type="application/pdf",
+                                                                        content_disposition="inline"))
+            return pdf_name
+
+        futures = [self._pool.submit(upload_chart, name) for name in chart_names]
+        pdf_future = self._pool.submit(upload_pdf)
+        uploaded = [name for name in (f.result() for f in futures) if name]
+        pdf_future.result()
+        logger.info(f"[reports] Relatório {pdf_name} publicado: {len(uploaded)} gráficos novos, "
+                    f"{len(chart_names) - len(uploaded)} já existentes")
+        return {"pdf": pdf_name, "graficos": chart_names, "novos": uploaded}
@@ -0,0 +1,117 @@
+import os
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Resultados de pesquisa guardados no servidor; o cookie da sessão só leva o id da pesquisa
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "500"))
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_STORE_TTL = int(os.getenv("RESULT_STORE_TTL", "3600"))
+
+
+class ResultStoreBackend:
+    """
+    Interface do backend onde ficam os resultados de pesquisa. Um backend partilhado entre
+    workers (ex.: Redis) implementa os mesmos métodos; os valores têm de ser serializáveis
+    em JSON e a expiração por TTL fica a cargo do backend.
+    """
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict, ttl: int):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class InProcessResultBackend(ResultStoreBackend):
+    """
+    Backend por omissão: LRU em memória, limitado a `max_entries` pesquisas e a `max_bytes` no
+    total (tamanho do valor em JSON). A pesquisa mais recente fica sempre, mesmo acima do limite.
+    Guarda referências para os objectos (sem serializar), por isso quem lê não os deve alterar.
+    """
+
+    def __init__(self, max_entries: int = RESULT_STORE_MAX_ENTRIES, max_bytes: int = RESULT_STORE_MAX_BYTES,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # chave -> (expira_em, bytes, valor), do menos para o mais recente
+        self._bytes = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at <= self._clock():
+                self._drop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, ttl: int):
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        evicted = 0
+        with self._lock:
+            now = self._clock()
+            for expired in [k for k, (expires_at, _, _) in self._data.items() if expires_at <= now or k == key]:
+                self._drop(expired)
+            self._data[key] = (now + ttl, size, value)
+            self._bytes += size
+            while len(self._data) > 1 and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._data)))
+                evicted += 1
+        if evicted:
+            logger.info(f"[result_store] {evicted} pesquisas removidas (LRU)")
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+
+    def _drop(self, key: str):
+        # Chamado com o lock adquirido
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+
+class ResultStore:
+    """
+    Resultados de pesquisa do lado do servidor, indexados por um id aleatório: a sessão guarda
+    só esse id e cada pedido lê daqui os ids e os posts brutos (já reduzidos) da pesquisa.
+    """
+
+    def __init__(self, backend: ResultStoreBackend = None, ttl: int = RESULT_STORE_TTL):
+        self.backend = backend or InProcessResultBackend()
+        self.ttl = ttl
+
+    def create(self, **fields) -> str:
+        search_id = uuid.uuid4().hex
+        self.backend.set(search_id, dict(fields), self.ttl)
+        return search_id
+
+    def get(self, search_id: str) -> dict:
+        """Campos da pesquisa, ou {} se o id faltar ou já tiver expirado."""
+        if not search_id:
+            return {}
+        return self.backend.get(search_id) or {}
+
+    def update(self, search_id: str, **fields):
+        """Substitui campos de uma pesquisa existente (renovando o TTL); ignora ids expirados."""
+        current = self.get(search_id)
+        if current:
+            self.backend.set(search_id, {**current, **fields}, self.ttl)
+
+    def delete(self, search_id: str):
+        if search_id:
+            self.backend.delete(search_id)
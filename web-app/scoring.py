@@ -0,0 +1,196 @@
+"""
+Classificação de sentimento fora dos workers web.
+
+- ScoringPool: pool de processos que carregam o modelo uma vez; os pedidos de vários threads
+  são juntados numa janela curta (SCORING_BATCH_WINDOW_MS) para encher as batches.
+- Serviço local: `python scoring.py` expõe o ScoringPool em HTTP, para todos os workers do
+  gunicorn partilharem o mesmo modelo (o web-app usa-o com SCORING_URL).
+- RemoteSentimentEngine: cliente desse serviço, com a mesma interface do SentimentEngine.
+"""
+import os
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+from inference import SENTIMENT_LABELS, classify, load_engine
+
+logger = logging.getLogger(__name__)
+
+SCORING_URL = os.getenv("SCORING_URL")
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "1"))
+SCORING_BATCH_WINDOW_MS = float(os.getenv("SCORING_BATCH_WINDOW_MS", "10"))
+SCORING_MAX_BATCH = int(os.getenv("SCORING_MAX_BATCH", "128"))
+SCORING_TIMEOUT = int(os.getenv("SCORING_TIMEOUT", "300"))
+SCORING_PORT = int(os.getenv("SCORING_PORT", "5100"))
+
+# Motor do processo worker (um por processo, carregado no initializer)
+_engine = None
+
+
+def _init_worker():
+    global _engine
+    _engine = load_engine()
+
+
+def _worker_info() -> dict:
+    return _engine.info()
+
+
+def _worker_score(texts) -> np.ndarray:
+    return _engine.predict_distribution(texts)
+
+
+class _EngineClient:
+    """Interface comum aos clientes: a classificação final é feita localmente, em NumPy."""
+
+    info = None
+
+    @property
+    def model_id(self) -> str:
+        return self.info["model_id"]
+
+    @property
+    def batch_size(self) -> int:
+        return self.info["batch_size"]
+
+    def classify(self, dist: np.ndarray):
+        return classify(dist, self.info["mode"], self.info["neutral_band"], self.info["has_neutral"])
+
+    def predict(self, texts) -> list:
+        classes, confidence = self.classify(self.predict_distribution(texts))
+        return [{"label": SENTIMENT_LABELS[c], "score": float(p)} for c, p in zip(classes, confidence)]
+
+
+class ScoringPool(_EngineClient):
+    """
+    Processos de inferência partilhados pelos threads deste processo. Um thread coalescedor
+    junta os pedidos que chegam dentro da janela (até SCORING_MAX_BATCH textos) e envia-os
+    como um único pedido ao pool, repartindo depois a distribuição por cada chamador.
+    """
+
+    def __init__(self, workers: int = SCORING_WORKERS, window_ms: float = SCORING_BATCH_WINDOW_MS,
+                 max_batch: int = SCORING_MAX_BATCH):
+        self.workers = max(1, workers)
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._pool = None
+        self._thread = None
+
+    def start(self):
+        started = time.perf_counter()
+        # spawn: os workers não herdam o estado (threads, ligações) do processo web
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         mp_context=multiprocessing.get_context("spawn"))
+        self.info = self._pool.submit(_worker_info).result()
+        self._thread = threading.Thread(target=self._coalesce, name="scoring-coalescer", daemon=True)
+        self._thread.start()
+        logger.info(f"[scoring] Pool de {self.workers} processos pronto em {time.perf_counter() - started:.1f}s "
+                    f"({self.model_id})")
+        return self
+
+    def submit(self, texts) -> Future:
+        future = Future()
+        texts = list(texts)
+        if not texts:
+            future.set_result(np.zeros((0, len(SENTIMENT_LABELS)), dtype=np.float32))
+        else:
+            self._queue.put((texts, future))
+        return future
+
+    def predict_distribution(self, texts) -> np.ndarray:
+        return self.submit(texts).result(timeout=SCORING_TIMEOUT)
+
+    def _coalesce(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.window
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            texts = [t for batch_texts, _ in pending for t in batch_texts]
+            try:
+                done = self._pool.submit(_worker_score, texts)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            if len(pending) > 1:
+                logger.debug(f"[scoring] {len(pending)} pedidos juntados numa batch de {len(texts)} textos")
+            # Não espera pelo resultado: com vários workers, as batches seguintes seguem em paralelo
+            done.add_done_callback(lambda result, pending=pending: self._split(result, pending))
+
+    @staticmethod
+    def _split(result: Future, pending):
+        try:
+            dist = result.result()
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        start = 0
+        for texts, future in pending:
+            future.set_result(dist[start:start + len(texts)])
+            start += len(texts)
+
+
+class RemoteSentimentEngine(_EngineClient):
+    """Cliente do serviço de scoring local (SCORING_URL)."""
+
+    def __init__(self, url: str = SCORING_URL):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def start(self):
+        resp = self.session.get(f"{self.url}/info", timeout=SCORING_TIMEOUT)
+        resp.raise_for_status()
+        self.info = resp.json()
+        logger.info(f"[scoring] A usar o serviço de scoring em {self.url} ({self.model_id})")
+        return self
+
+    def predict_distribution(self, texts) -> np.ndarray:
+        resp = self.session.post(f"{self.url}/score", json={"texts": list(texts)}, timeout=SCORING_TIMEOUT)
+        resp.raise_for_status()
+        return np.asarray(resp.json()["dist"], dtype=np.float32).reshape(-1, len(SENTIMENT_LABELS))
+
+
+def create_app(pool: ScoringPool):
+    from flask import Flask, request, jsonify
+
+    service = Flask(__name__)
+
+    @service.route("/info")
+    def info():
+        return jsonify(pool.info)
+
+    @service.route("/score", methods=["POST"])
+    def score():
+        texts = (request.get_json(silent=True) or {}).get("texts")
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            return jsonify({"error": "Formato esperado: {\"texts\": [\"...\", ...]}"}), 400
+        return jsonify({"dist": pool.predict_distribution(texts).tolist()})
+
+    return service
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    scoring_pool = ScoringPool().start()
+    # threaded: pedidos concorrentes dos workers web são juntados pelo coalescedor
+    create_app(scoring_pool).run(host="127.0.0.1", port=SCORING_PORT, threaded=True)
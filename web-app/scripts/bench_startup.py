@@ -0,0 +1,69 @@
+"""
+Mede o arranque do web-app: tempo de import de app.py e tempo até a primeira análise poder
+correr (carregamento dos componentes + uma classificação), em cada modo de arranque.
+Cada medição corre num processo novo, para não reaproveitar módulos já importados.
+
+    python scripts/bench_startup.py [--modes lazy eager] [--runs 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+WEB_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Corre dentro do processo filho; imprime uma linha JSON com as medições
+CHILD = r"""
+import json, time
+started = time.perf_counter()
+import app
+import_seconds = time.perf_counter() - started
+
+started = time.perf_counter()
+app.load_all(app.COMPONENTS)
+try:
+    app.sentiment_engine.get().predict(["The first request after startup."])
+except Exception as e:
+    pass
+first_request_seconds = time.perf_counter() - started
+
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "first_request_seconds": first_request_seconds,
+    "components": {c.name: c.status() for c in app.COMPONENTS},
+}))
+"""
+
+
+def run_once(mode: str) -> dict:
+    # Sem warm-up em background: mede-se o custo que o primeiro pedido pagaria
+    env = {**os.environ, "STARTUP_MODE": mode, "STARTUP_WARMUP": "false"}
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=WEB_APP_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["lazy", "eager"], choices=["lazy", "eager"])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    report = {}
+    for mode in args.modes:
+        runs = [run_once(mode) for _ in range(args.runs)]
+        report[mode] = {
+            "import_seconds": round(statistics.median(r["import_seconds"] for r in runs), 3),
+            "first_request_seconds": round(statistics.median(r["first_request_seconds"] for r in runs), 3),
+            "components": runs[-1]["components"],
+        }
+        print(f"{mode:>6}: import {report[mode]['import_seconds']:.2f}s, "
+              f"primeiro pedido {report[mode]['first_request_seconds']:.2f}s (mediana de {args.runs})")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+# Termos guardados por post (os mais frequentes) e vocabulário máximo da nuvem de palavras
+TERMS_PER_POST_MAX = int(os.getenv("TERMS_PER_POST_MAX", "64"))
+WORDCLOUD_MAX_WORDS = int(os.getenv("WORDCLOUD_MAX_WORDS", "200"))
+
+# Mesma regex de tokens do WordCloud.generate, mas sem colocações (bigramas), sem juntar plurais
+# e tudo em minúsculas: a nuvem não é idêntica à que o WordCloud gerava a partir do texto
+_TOKEN_RE = re.compile(r"\w[\w']+")
+_stopwords = None
+
+
+def _get_stopwords():
+    global _stopwords
+    if _stopwords is None:
+        from wordcloud import STOPWORDS
+        _stopwords = frozenset(w.lower() for w in STOPWORDS)
+    return _stopwords
+
+
+def term_frequencies(text: str, max_terms: int = TERMS_PER_POST_MAX) -> dict:
+    """
+    Contagem dos termos de um texto (minúsculas, sem stopwords nem números), limitada aos
+    `max_terms` mais frequentes para ficar compacta no documento do post.
+    """
+    stopwords = _get_stopwords()
+    counts = Counter()
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token.endswith("'s"):
+            token = token[:-2]
+        if token not in stopwords and not token.isdigit() and len(token) > 1:
+            counts[token] += 1
+    return dict(counts.most_common(max_terms))
+
+
+def merge_frequencies(term_dicts, max_words: int = WORDCLOUD_MAX_WORDS) -> dict:
+    """
+    Soma as contagens de vários posts (uma só bincount sobre o vocabulário) e devolve os
+    `max_words` termos mais frequentes, ordenados, prontos para generate_from_frequencies.
+    """
+    vocabulary = {}
+    ids, counts = [], []
+    for terms in term_dicts:
+        for word, count in terms.items():
+            ids.append(vocabulary.setdefault(word, len(vocabulary)))
+            counts.append(count)
+    if not vocabulary:
+        return {}
+
+    totals = np.bincount(np.asarray(ids), weights=np.asarray(counts, dtype=np.float64),
+                         minlength=len(vocabulary))
+    words = np.array(list(vocabulary), dtype=object)
+    if len(totals) > max_words:
+        top = np.argpartition(-totals, max_words - 1)[:max_words]
+    else:
+        top = np.arange(len(totals))
+    top = top[np.lexsort((words[top], -totals[top]))]
+    return {str(words[i]): int(totals[i]) for i in top}
@@ -0,0 +1,278 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Credenciais Translator
+TRANSLATOR_KEY = os.getenv("TRANSLATOR_KEY")
+TRANSLATOR_ENDPOINT = os.getenv("TRANSLATOR_ENDPOINT")
+TRANSLATOR_REGION = os.getenv("TRANSLATOR_REGION", "westeurope")
+
+# Cache de traduções: tier local (SQLite) + tier partilhado no Cosmos, ambos com TTL
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "cache/translations.sqlite3")
+TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", str(30 * 24 * 3600)))
+TRANSLATION_COSMOS_CONTAINER = os.getenv("TRANSLATION_COSMOS_CONTAINER", "translations")
+TRANSLATION_CACHE_READ_CONCURRENCY = int(os.getenv("TRANSLATION_CACHE_READ_CONCURRENCY", "8"))
+
+# Limites de um pedido /translate (elementos por pedido e caracteres no total)
+TRANSLATOR_MAX_ELEMENTS = int(os.getenv("TRANSLATOR_MAX_ELEMENTS", "100"))
+TRANSLATOR_MAX_CHARS = int(os.getenv("TRANSLATOR_MAX_CHARS", "50000"))
+TRANSLATOR_CONCURRENCY = int(os.getenv("TRANSLATOR_CONCURRENCY", "4"))
+TRANSLATOR_MAX_RETRIES = int(os.getenv("TRANSLATOR_MAX_RETRIES", "3"))
+
+
+def text_hash(text: str) -> str:
+    """Chave da cache: hash do texto original, igual para o mesmo texto em qualquer subreddit."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SqliteTranslationCache:
+    """Tier local em disco: sobrevive a reinícios do processo e é partilhado pelos workers do contentor."""
+
+    def __init__(self, path: str, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " hash TEXT PRIMARY KEY, translated TEXT NOT NULL,"
+                " language TEXT, created_at REAL NOT NULL)"
+            )
+
+    def get_many(self, hashes) -> dict:
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        min_created = time.time() - self.ttl
+        found = {}
+        with self._lock:
+            # Em blocos para não exceder o limite de parâmetros do SQLite
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT hash, translated, language FROM translations "
+                    f"WHERE hash IN ({placeholders}) AND created_at >= ?",
+                    [*chunk, min_created]
+                ).fetchall()
+                for h, translated, language in rows:
+                    found[h] = {"translated": translated, "language": language}
+        return found
+
+    def set_many(self, entries: dict):
+        if not entries:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations (hash, translated, language, created_at) VALUES (?, ?, ?, ?)",
+                [(h, e["translated"], e.get("language"), now) for h, e in entries.items()]
+            )
+
+
+class CosmosTranslationCache:
+    """
+    Tier partilhado entre instâncias: container próprio com partition key /id e default_ttl,
+    para o Cosmos expirar as traduções antigas sozinho.
+    """
+
+    def __init__(self, database_client, container_name: str, ttl: int):
+        self._db = database_client
+        self._container_name = container_name
+        self._ttl = ttl
+        self._container = None
+        self._disabled = False
+        self._lock = threading.Lock()
+
+    def _get_container(self):
+        if self._container is None and not self._disabled:
+            with self._lock:
+                if self._container is None and not self._disabled:
+                    try:
+                        from azure.cosmos import PartitionKey
+                        self._container = self._db.create_container_if_not_exists(
+                            id=self._container_name,
+                            partition_key=PartitionKey(path="/id"),
+                            default_ttl=self._ttl
+                        )
+                    except Exception as e:
+                        logger.warning(f"Tier Cosmos da cache de traduções desactivado: {e}")
+                        self._disabled = True
+        return self._container
+
+    def get_many(self, hashes) -> dict:
+        container = self._get_container()
+        hashes = list(hashes)
+        if container is None or not hashes:
+            return {}
+
+        def read(h):
+            try:
+                doc = container.read_item(item=h, partition_key=h)
+                return h, {"translated": doc["translated"], "language": doc.get("language")}
+            except Exception:
+                return h, None
+
+        with ThreadPoolExecutor(max_workers=min(TRANSLATION_CACHE_READ_CONCURRENCY, len(hashes))) as pool:
+            return {h: entry for h, entry in pool.map(read, hashes) if entry is not None}
+
+    def set_many(self, entries: dict):
+        container = self._get_container()
+        if container is None:
+            return
+        for h, entry in entries.items():
+            try:
+                container.upsert_item({"id": h, **entry})
+            except Exception as e:
+                logger.warning(f"Falha ao gravar tradução {h[:12]} no Cosmos: {e}")
+
+
+class TranslationCache:
+    """Cache em dois tiers: primeiro o SQLite local, depois o Cosmos (promovendo para o local)."""
+
+    def __init__(self, tiers):
+        self.tiers = [t for t in tiers if t is not None]
+
+    def get_many(self, hashes) -> dict:
+        found = {}
+        missing = list(dict.fromkeys(hashes))
+        for pos, tier in enumerate(self.tiers):
+            if not missing:
+                break
+            try:
+                tier_found = tier.get_many(missing)
+            except Exception as e:
+                logger.warning(f"Tier {type(tier).__name__} da cache de traduções falhou: {e}")
+                continue
+            if tier_found:
+                found.update(tier_found)
+                # Promove para os tiers anteriores (mais rápidos)
+                for faster in self.tiers[:pos]:
+                    faster.set_many(tier_found)
+                missing = [h for h in missing if h not in tier_found]
+        return found
+
+    def set_many(self, entries: dict):
+        for tier in self.tiers:
+            try:
+                tier.set_many(entries)
+            except Exception as e:
+                logger.warning(f"Tier {type(tier).__name__} da cache de traduções falhou: {e}")
+
+
+class TranslationService:
+    """Tradução para inglês via Azure Translator, com cache por hash do texto original."""
+
+    def __init__(self, cosmos_db=None):
+        tiers = []
+        try:
+            tiers.append(SqliteTranslationCache(TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_TTL))
+        except Exception as e:
+            logger.warning(f"Cache local de traduções indisponível ({TRANSLATION_CACHE_PATH}): {e}")
+        if cosmos_db is not None:
+            tiers.append(CosmosTranslationCache(cosmos_db, TRANSLATION_COSMOS_CONTAINER, TRANSLATION_CACHE_TTL))
+        self.cache = TranslationCache(tiers)
+
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=max(8, TRANSLATOR_CONCURRENCY)))
+        self.session.headers.update({
+            'Ocp-Apim-Subscription-Key': TRANSLATOR_KEY or "",
+            'Ocp-Apim-Subscription-Region': TRANSLATOR_REGION,
+            'Content-Type': 'application/json'
+        })
+
+    def _post_translate(self, texts) -> list:
+        """
+        Um pedido /translate para vários textos, sem 'from': o Translator detecta o idioma
+        de cada elemento na mesma chamada. Repete em 429/5xx respeitando o Retry-After.
+        """
+        for attempt in range(TRANSLATOR_MAX_RETRIES + 1):
+            resp = self.session.post(TRANSLATOR_ENDPOINT + "/translate",
+                                     params={'api-version': '3.0', 'to': ['en']},
+                                     json=[{'text': t} for t in texts], timeout=30)
+            if (resp.status_code == 429 or resp.status_code >= 500) and attempt < TRANSLATOR_MAX_RETRIES:
+                delay = float(resp.headers.get("Retry-After", 2 ** attempt))
+                logger.warning(f"[translation] Translator respondeu {resp.status_code}; nova tentativa em {delay:.0f}s")
+                time.sleep(delay)
+                continue
+            resp.raise_for_status()
+            data = resp.json()
+            if len(data) != len(texts):
+                raise RuntimeError(f"Translator devolveu {len(data)} elementos para {len(texts)} textos")
+            return [{
+                "translated": element['translations'][0]['text'],
+                "language": (element.get('detectedLanguage') or {}).get('language')
+            } for element in data]
+
+    def _translate_batch(self, batch) -> dict:
+        """
+        Traduz uma batch [(hash, texto)]. Se o pedido falhar, divide a batch ao meio e repete,
+        até isolar os elementos que falham; os restantes ficam traduzidos.
+        """
+        try:
+            return dict(zip((h for h, _ in batch), self._post_translate([t for _, t in batch])))
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Erro ao traduzir texto {batch[0][0][:12]}: {e}")
+                return {}
+            logger.warning(f"[translation] Batch de {len(batch)} textos falhou ({e}); a dividir e repetir.")
+        middle = len(batch) // 2
+        return {**self._translate_batch(batch[:middle]), **self._translate_batch(batch[middle:])}
+
+    @staticmethod
+    def _pack_batches(pending: dict) -> list:
+        """Agrupa os textos em batches dentro dos limites de elementos e caracteres do Translator."""
+        batches, batch, chars = [], [], 0
+        for h, text in pending.items():
+            text = text[:TRANSLATOR_MAX_CHARS]
+            if batch and (len(batch) >= TRANSLATOR_MAX_ELEMENTS or chars + len(text) > TRANSLATOR_MAX_CHARS):
+                batches.append(batch)
+                batch, chars = [], 0
+            batch.append((h, text))
+            chars += len(text)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def translate_many(self, texts) -> list:
+        """
+        Traduz uma lista de textos para inglês. Devolve uma lista alinhada com `texts`,
+        com None nas posições cuja tradução falhou (o chamador decide o fallback).
+        Textos repetidos ou já traduzidos antes (cache) não voltam ao Translator.
+        """
+        hashes = [text_hash(t) for t in texts]
+        cached = self.cache.get_many(hashes)
+
+        pending = {}
+        for h, text in zip(hashes, texts):
+            if h not in cached and h not in pending:
+                pending[h] = text
+        logger.info(f"[translation] {len(texts)} textos: {len(texts) - len(pending)} da cache, "
+                    f"{len(pending)} a traduzir")
+
+        translated = {}
+        if pending and not (TRANSLATOR_ENDPOINT and TRANSLATOR_KEY):
+            logger.error("TRANSLATOR_ENDPOINT/TRANSLATOR_KEY não configurados; textos ficam por traduzir.")
+        elif pending:
+            batches = self._pack_batches(pending)
+            with ThreadPoolExecutor(max_workers=min(TRANSLATOR_CONCURRENCY, len(batches))) as pool:
+                for batch_result in pool.map(self._translate_batch, batches):
+                    translated.update(batch_result)
+            logger.info(f"[translation] {len(translated)}/{len(pending)} traduzidos em {len(batches)} pedidos")
+            self.cache.set_many(translated)
+
+        results = {**cached, **translated}
+        return [results[h]["translated"] if h in results else None for h in hashes]